@@ -0,0 +1,321 @@
+import argparse
+import os
+import random
+import shutil
+import struct
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TypeVar
+
+from src.app.osu_parser import OSUParser
+
+# Deterministic generator of synthetic Songs folders for benchmarks.
+#
+# Build a library from the project root:
+#     python -m benchmarks.library /tmp/Songs --mapsets 2000
+#
+# The same spec and seed always produce the same tree, byte for byte, so runs
+# on different commits are comparable. File contents are filler: only the
+# .osu and .osb files are meaningful, everything else just has a realistic
+# name, location and (scaled down) size.
+#
+# With --osu-db, an `osu!.db` indexing the generated difficulties is written
+# next to the Songs folder, where osu! keeps it.
+
+_T = TypeVar("_T")
+
+_ARTISTS = ["Camellia", "xi", "DragonForce", "Kana Nishino", "nekodex", "LeaF", "Ryu", "t+pazolite"]
+_TITLES = ["Galaxy Collapse", "Freedom Dive", "Through the Fire", "Blue Zenith", "Harumachi", "Teo", "Aleph-0"]
+# Titles for mapsets saved in a legacy single-byte encoding, which the parser has to fall back to.
+_LEGACY_TITLES = {
+    "cp1251": ["Песня", "Кукушка", "Звезда по имени Солнце"],
+    "latin-1": ["Café Noir", "Déjà Vu", "Señorita"],
+}
+_VERSIONS = ["Easy", "Normal", "Hard", "Insane", "Expert", "Extra", "Extreme", "Marathon"]
+
+
+@dataclass
+class LibrarySpec:
+    """Everything that shapes a generated library. Sizes are in bytes."""
+
+    mapsets: int = 500
+    """The number of beatmap folders, not counting duplicates."""
+    difficulties: tuple[int, int] = (1, 8)
+    """The range of difficulties per mapset."""
+    mode_weights: dict[int, float] = field(default_factory=lambda: {0: 0.7, 1: 0.1, 2: 0.1, 3: 0.1})
+    """How likely each game mode is, for a whole mapset (0 osu!, 1 taiko, 2 catch, 3 mania)."""
+    mixed_mode_fraction: float = 0.15
+    """The share of mapsets whose difficulties are of different modes."""
+    encoding_weights: dict[str, float] = field(
+        default_factory=lambda: {"utf-8": 0.85, "cp1251": 0.1, "latin-1": 0.05}
+    )
+    """The encodings .osu files are saved with."""
+    hit_objects: tuple[int, int] = (200, 2500)
+    """The range of hit objects per difficulty."""
+    storyboard_fraction: float = 0.3
+    """The share of mapsets with a storyboard (.osb file plus sprites)."""
+    storyboard_sprites: tuple[int, int] = (5, 60)
+    hitsound_fraction: float = 0.4
+    """The share of mapsets with custom hitsounds."""
+    hitsounds: tuple[int, int] = (5, 40)
+    nested_fraction: float = 0.2
+    """The share of storyboards that keep their sprites in nested subfolders."""
+    video_fraction: float = 0.15
+    duplicate_fraction: float = 0.03
+    """The share of mapsets that are imported a second time, into a folder with the same ID."""
+    no_id_fraction: float = 0.02
+    """The share of folders without a numeric ID in their name."""
+    shared_background_fraction: float = 0.1
+    """The share of mapsets that reuse the background of another mapset."""
+    audio_size: int = 64 * 1024
+    background_size: int = 16 * 1024
+    video_size: int = 128 * 1024
+    sprite_size: int = 1024
+    hitsound_size: int = 2048
+    seed: int = 1
+
+
+@dataclass
+class LibraryStats:
+    folders: int = 0
+    files: int = 0
+    bytes: int = 0
+    osu_files: int = 0
+
+
+def build_osu_file(
+    rnd: random.Random,
+    *,
+    mode: int,
+    title: str,
+    artist: str,
+    version: str,
+    beatmap_id: int,
+    beatmapset_id: int,
+    audio: str,
+    background: str,
+    video: str | None,
+    hit_objects: int
+) -> str:
+    """Returns the text of a syntactically valid .osu file."""
+    lines = [
+        "osu file format v14",
+        "",
+        "[General]",
+        f"AudioFilename: {audio}",
+        "AudioLeadIn: 0",
+        f"PreviewTime: {rnd.randrange(0, 60000)}",
+        "Countdown: 0",
+        "SampleSet: Soft",
+        f"Mode: {mode}",
+        "",
+        "[Editor]",
+        "DistanceSpacing: 1.2",
+        "BeatDivisor: 4",
+        "",
+        "[Metadata]",
+        f"Title:{title}",
+        f"Artist:{artist}",
+        "Creator:benchmark",
+        f"Version:{version}",
+        f"BeatmapID:{beatmap_id}",
+        f"BeatmapSetID:{beatmapset_id}",
+        "",
+        "[Difficulty]",
+        f"HPDrainRate:{rnd.randint(2, 7)}",
+        f"CircleSize:{rnd.randint(3, 5)}",
+        f"OverallDifficulty:{rnd.randint(4, 9)}",
+        "",
+        "[Events]",
+        "//Background and Video events",
+        f'0,0,"{background}",0,0',
+    ]
+    if video:
+        lines.append(f'Video,0,"{video}"')
+    lines.extend(["//Break Periods", "//Storyboard Layer 0 (Background)", "", "[TimingPoints]"])
+    lines.extend(f"{i * 2000},{rnd.choice((300, 400, 500))},4,2,0,60,1,0" for i in range(hit_objects // 50 + 1))
+    lines.extend(["", "[HitObjects]"])
+    time = 1000
+    for _ in range(hit_objects):
+        time += rnd.choice((120, 240, 480))
+        x, y = rnd.randrange(512), rnd.randrange(384)
+        if rnd.random() < 0.4:
+            lines.append(f"{x},{y},{time},2,0,B|{(x + 60) % 512}:{(y + 40) % 384},1,140")
+        else:
+            lines.append(f"{x},{y},{time},1,0,0:0:0:0:")
+    return "\r\n".join(lines) + "\r\n"
+
+
+def _write(path: Path, data: bytes, stats: LibraryStats):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    stats.files += 1
+    stats.bytes += len(data)
+
+
+def _filler(rnd: random.Random, size: int) -> bytes:
+    """Random bytes, so identical files only appear where the generator puts them."""
+    return rnd.randbytes(size)
+
+
+def _pick(rnd: random.Random, weights: dict[_T, float]) -> _T:
+    return rnd.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def generate_library(root: Path, spec: LibrarySpec) -> LibraryStats:
+    """Builds a Songs folder at `root`, which must not exist yet."""
+    root.mkdir(parents=True)
+    rnd = random.Random(spec.seed)
+    stats = LibraryStats()
+    backgrounds: list[bytes] = []
+    next_beatmap_id = 100000
+    generated: list[tuple[str, Path]] = []
+
+    for index in range(spec.mapsets):
+        set_id = 10000 + index * 7
+        encoding = _pick(rnd, spec.encoding_weights)
+        artist = rnd.choice(_ARTISTS)
+        title = rnd.choice(_LEGACY_TITLES.get(encoding, _TITLES))
+
+        if rnd.random() < spec.no_id_fraction:
+            folder_name = f"{artist} - {title} ({index})"
+            beatmapset_id = -1
+        else:
+            folder_name = f"{set_id} {artist} - {title}"
+            beatmapset_id = set_id
+        folder = root / folder_name
+        folder.mkdir()
+        stats.folders += 1
+
+        audio = f"{title}.mp3" if encoding != "utf-8" else "audio.mp3"
+        _write(folder / audio, _filler(rnd, spec.audio_size), stats)
+
+        if backgrounds and rnd.random() < spec.shared_background_fraction:
+            background_data = rnd.choice(backgrounds)
+        else:
+            background_data = _filler(rnd, spec.background_size)
+            backgrounds.append(background_data)
+        background = rnd.choice(("bg.jpg", "background.png", "BG.JPG"))
+        _write(folder / background, background_data, stats)
+
+        video = None
+        if rnd.random() < spec.video_fraction:
+            video = "video.mp4"
+            _write(folder / video, _filler(rnd, spec.video_size), stats)
+
+        if rnd.random() < spec.storyboard_fraction:
+            sprite_dir = "sb/elements/deep" if rnd.random() < spec.nested_fraction else "sb"
+            sprites = [f"{sprite_dir}/s{i}.png" for i in range(rnd.randint(*spec.storyboard_sprites))]
+            for sprite in sprites:
+                _write(folder / sprite, _filler(rnd, spec.sprite_size), stats)
+            osb = "[Events]\r\n" + "".join(f'Sprite,Foreground,Centre,"{s}",320,240\r\n' for s in sprites)
+            _write(folder / f"{artist} - {title} (benchmark).osb", osb.encode(encoding), stats)
+
+        if rnd.random() < spec.hitsound_fraction:
+            for i in range(rnd.randint(*spec.hitsounds)):
+                name = f"{rnd.choice(('soft', 'normal', 'drum'))}-hit{rnd.choice(('normal', 'clap', 'whistle'))}{i}.wav"
+                _write(folder / name, _filler(rnd, spec.hitsound_size), stats)
+
+        set_mode = _pick(rnd, spec.mode_weights)
+        mixed = rnd.random() < spec.mixed_mode_fraction
+        for version in _VERSIONS[:rnd.randint(*spec.difficulties)]:
+            mode = _pick(rnd, spec.mode_weights) if mixed else set_mode
+            text = build_osu_file(
+                rnd, mode=mode, title=title, artist=artist, version=version,
+                beatmap_id=next_beatmap_id if beatmapset_id > 0 else 0,
+                beatmapset_id=beatmapset_id, audio=audio, background=background,
+                video=video, hit_objects=rnd.randint(*spec.hit_objects)
+            )
+            next_beatmap_id += 1
+            _write(folder / f"{artist} - {title} (benchmark) [{version}].osu", text.encode(encoding), stats)
+            stats.osu_files += 1
+
+        generated.append((folder_name, folder))
+
+    # Re-imports of existing mapsets into a folder with the same ID prefix.
+    for folder_name, folder in rnd.sample(generated, int(len(generated) * spec.duplicate_fraction)):
+        if not folder_name[0].isdigit():
+            continue
+        copy = folder.with_name(folder.name + " (1)")
+        shutil.copytree(folder, copy)
+        stats.folders += 1
+        for file in copy.rglob("*"):
+            if file.is_file():
+                stats.files += 1
+                stats.bytes += file.stat().st_size
+                stats.osu_files += file.suffix == ".osu"
+
+    return stats
+
+
+def _db_string(value: str) -> bytes:
+    """A string as osu! stores it: 0x0b, the ULEB128 length of its UTF-8 bytes, the bytes."""
+    data = value.encode("utf-8")
+    length, header = len(data), bytearray([0x0b])
+    while True:
+        part = length & 0x7f
+        length >>= 7
+        header.append(part | (0x80 if length else 0))
+        if not length:
+            return bytes(header) + data
+
+
+def write_osu_db(songs: Path, db_path: Path, version: int = 20250108) -> int:
+    """
+    Writes an `osu!.db` with every difficulty in `songs`, as osu! would, and
+    returns the number of difficulties. Only the fields the cleaner reads
+    have real values. `version` must be 20191106 or later; it picks how star
+    ratings are stored (singles from 20250107 on, doubles before).
+    """
+    entries = []
+    for folder in sorted(p for p in songs.iterdir() if p.is_dir()):
+        for osu_path in sorted(folder.glob("*.osu")):
+            osu_file = OSUParser.parse_file(osu_path)
+            ticks = os.stat(osu_path).st_mtime_ns // 100 + 621355968000000000
+            star_rating = struct.pack("<BiBf", 0x08, 0, 0x0c, 4.5) if version >= 20250107 \
+                else struct.pack("<BiBd", 0x08, 0, 0x0d, 4.5)
+            entries.append(b"".join([
+                *(_db_string(s) for s in ("artist", "artist", "title", "title", "benchmark", "version")),
+                _db_string(osu_file.audio_filename),
+                _db_string("0" * 32),
+                _db_string(osu_path.name),
+                struct.pack("<Bhhhqffffd", 4, 100, 50, 1, ticks, 9, 4, 5, 8, 1.4),
+                *(struct.pack("<i", 1) + star_rating for _ in range(4)),
+                struct.pack("<iii", 120, 120000, 30000),
+                struct.pack("<i", 1) + struct.pack("<dd?", 300.0, 1000.0, True),
+                struct.pack("<ii", osu_file.beatmap_id or 0, osu_file.beatmapset_id or -1),
+                struct.pack("<i4Bhf", 0, 9, 9, 9, 9, 0, 0.7),
+                struct.pack("<B", osu_file.mode.value),
+                _db_string(""), _db_string("tags"),
+                struct.pack("<h", 0),
+                b"\x00",  # No title font.
+                struct.pack("<?q?", True, 0, False),
+                _db_string(folder.name),
+                struct.pack("<q5?", 0, False, False, False, False, False),
+                struct.pack("<iB", 0, 0),
+            ]))
+    header = struct.pack("<ii?q", version, len(entries), True, 0) + _db_string("benchmark")
+    db_path.write_bytes(header + struct.pack("<i", len(entries)) + b"".join(entries) + struct.pack("<i", 0))
+    return len(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic osu! Songs folder.")
+    parser.add_argument("path", type=Path, help="where to create the Songs folder (must not exist)")
+    parser.add_argument("--mapsets", type=int, default=LibrarySpec.mapsets)
+    parser.add_argument("--seed", type=int, default=LibrarySpec.seed)
+    parser.add_argument("--osu-db", action="store_true", help="also write osu!.db next to the Songs folder")
+    args = parser.parse_args()
+
+    stats = generate_library(args.path, LibrarySpec(mapsets=args.mapsets, seed=args.seed))
+    print(
+        f"{stats.folders} folders, {stats.osu_files} .osu files, "
+        f"{stats.files} files, {stats.bytes / 1024 / 1024:.1f} MiB"
+    )
+    if args.osu_db:
+        db_path = args.path.parent / "osu!.db"
+        print(f"{write_osu_db(args.path, db_path)} difficulties written to {db_path}")
+
+
+if __name__ == "__main__":
+    main()
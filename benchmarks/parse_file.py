@@ -0,0 +1,117 @@
+import argparse
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+
+from src.app.osu_parser import OSUParser
+
+# Benchmark for `OSUParser.parse_file` on marathon maps.
+#
+# Run from the project root:
+#     python -m benchmarks.parse_file --hit-objects 50000
+#
+# It compares the section-aware parser against a reference that decodes and
+# checks every line of the file, which is how `parse_file` used to work.
+
+_IMG_LINE_REGEX = re.compile(r'^\d+,\d+,\"(.+?\.(?:jpe?g|png))\"', re.IGNORECASE)
+_VIDEO_LINE_REGEX = re.compile(r'^Video,\d*,.?\"(.+?\.(?:avi|mp4|flv))\"', re.IGNORECASE)
+
+
+def build_marathon_map(path: Path, hit_objects: int, timing_points: int):
+    """Writes a syntactically valid .osu file with the given number of objects."""
+    lines = [
+        "osu file format v14",
+        "",
+        "[General]",
+        "AudioFilename: audio.mp3",
+        "AudioLeadIn: 0",
+        "PreviewTime: 120000",
+        "Mode: 0",
+        "",
+        "[Editor]",
+        "DistanceSpacing: 1.2",
+        "",
+        "[Metadata]",
+        "Title:Marathon",
+        "Artist:Benchmark",
+        "Version:Extreme",
+        "",
+        "[Difficulty]",
+        "HPDrainRate:5",
+        "CircleSize:4",
+        "",
+        "[Events]",
+        "//Background and Video events",
+        '0,0,"bg.jpg",0,0',
+        'Video,0,"video.mp4"',
+        "//Storyboard Layer 0 (Background)",
+        "",
+        "[TimingPoints]",
+    ]
+    lines.extend(f"{i * 500},500,4,2,0,60,1,0" for i in range(timing_points))
+    lines.extend(["", "[HitObjects]"])
+    lines.extend(
+        f"{i % 512},{i % 384},{i * 120},6,0,B|{(i + 40) % 512}:{(i + 40) % 384},1,140"
+        for i in range(hit_objects)
+    )
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def full_scan(file_path: Path) -> tuple[str, set[str], set[str]]:
+    """Reference implementation: applies every check to every line of the file."""
+    audio_filename = ""
+    image_filenames: set[str] = set()
+    video_filenames: set[str] = set()
+    with open(file_path, 'r', encoding="UTF-8") as file:
+        for line in file:
+            clean_line = line.strip()
+            if not clean_line or clean_line.startswith("//"):
+                continue
+            if line.startswith("AudioFilename: "):
+                audio_filename = os.path.normpath(line.split(":", 1)[1].strip()).lower()
+            elif match := _IMG_LINE_REGEX.match(line):
+                image_filenames.add(os.path.normpath(match.group(1)).lower())
+            elif match := _VIDEO_LINE_REGEX.match(line):
+                video_filenames.add(os.path.normpath(match.group(1)).lower())
+    return audio_filename, image_filenames, video_filenames
+
+
+def best_of(func, repeat: int) -> float:
+    """Returns the fastest of `repeat` runs, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark OSUParser.parse_file on marathon maps.")
+    parser.add_argument("--hit-objects", type=int, default=30000)
+    parser.add_argument("--timing-points", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        map_path = Path(tmp_dir) / "marathon.osu"
+        build_marathon_map(map_path, args.hit_objects, args.timing_points)
+        size_kib = map_path.stat().st_size / 1024
+
+        parsed = OSUParser.parse_file(map_path)
+        reference = full_scan(map_path)
+        assert (parsed.audio_filename, parsed.image_filenames, parsed.video_filenames) == reference
+
+        old = best_of(lambda: full_scan(map_path), args.repeat)
+        new = best_of(lambda: OSUParser.parse_file(map_path), args.repeat)
+
+    print(f"Map: {args.hit_objects} hit objects, {args.timing_points} timing points, {size_kib:.0f} KiB")
+    print(f"Full scan:      {old * 1000:8.2f} ms")
+    print(f"Section-aware:  {new * 1000:8.2f} ms")
+    print(f"Speedup:        {old / new:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import redirect_stdout
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from threading import Lock
+from typing import Callable
+
+from src.app.clean_plan import PlanExecutor
+from src.app.cleaner import Cleaner, _FolderCleaner
+from src.app.osu_parser import OSUParser
+from src.app.shrink import DEFAULT_MAX_SIZE, DEFAULT_QUALITY
+from src.app.types import CleanerParams, OSUGameModes
+
+from .library import LibrarySpec, generate_library, write_osu_db
+from .parse_file import build_marathon_map
+
+# Benchmark suite for the parser and the cleaner, on a generated Songs folder.
+#
+# Run from the project root, once on the reference commit and then on yours:
+#     python -m benchmarks.suite --save-baseline
+#     python -m benchmarks.suite --compare
+#
+# Every benchmark reports its wall time (the best of --repeat runs), and from
+# one extra run the filesystem calls it made and its peak traced memory. That
+# run is separate because tracing slows everything down. Benchmarks that delete
+# files run on a fresh copy of the library each time; copying isn't measured.
+
+_DEFAULT_BASELINE = Path(__file__).with_name("baseline.json")
+
+# Filesystem calls are counted with audit hooks (PEP 578). Only these events
+# are counted; `stat` calls raise no audit event, so they are not included.
+_FS_EVENTS = frozenset({
+    "open", "os.scandir", "os.listdir", "os.remove", "os.rmdir", "os.mkdir",
+    "os.rename", "os.symlink", "os.link", "shutil.rmtree", "shutil.copyfile",
+})
+
+
+class _FsCallCounter:
+    """Counts audited filesystem calls on all threads while active."""
+
+    def __init__(self):
+        self.active = False
+        self.counts: Counter[str] = Counter()
+        self._lock = Lock()
+        # Audit hooks can't be removed, so one hook is installed and toggled.
+        sys.addaudithook(self.__hook)
+
+    def __hook(self, event: str, _args: tuple):
+        if self.active and event in _FS_EVENTS:
+            with self._lock:
+                self.counts[event] += 1
+
+    def start(self):
+        self.counts = Counter()
+        self.active = True
+
+    def stop(self) -> dict[str, int]:
+        self.active = False
+        return dict(sorted(self.counts.items()))
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    wall_s: float
+    fs_calls: dict[str, int] = field(default_factory=dict)
+    peak_memory: int = 0
+
+    @property
+    def total_fs_calls(self) -> int:
+        return sum(self.fs_calls.values())
+
+
+def measure(
+    name: str,
+    setup: Callable[[], object],
+    func: Callable[[object], None],
+    repeat: int,
+    counter: _FsCallCounter
+) -> BenchmarkResult:
+    """Runs `func(setup())` `repeat` times for the wall time, then once more traced."""
+    best = float("inf")
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        func(state)
+        best = min(best, time.perf_counter() - start)
+
+    state = setup()
+    tracemalloc.start()
+    counter.start()
+    try:
+        func(state)
+    finally:
+        fs_calls = counter.stop()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return BenchmarkResult(name, best, fs_calls, peak)
+
+
+def _params(workers: int, use_osu_db: bool = False) -> CleanerParams:
+    """The most common setup: osu! standard only, backgrounds kept."""
+    return {
+        "user_images": None,
+        "delete_images": False,
+        "delete_modes": [OSUGameModes.TAIKO, OSUGameModes.CATCH, OSUGameModes.MANIA],
+        "force_clean": True,
+        "keep_videos": False,
+        "ignore_id_limit": False,
+        "dangerous_clean_no_id": False,
+        "workers": workers,
+        "dedupe_backgrounds": False,
+        "shrink_backgrounds": False,
+        "shrink_max_size": DEFAULT_MAX_SIZE,
+        "shrink_quality": DEFAULT_QUALITY,
+        "dedupe_mapsets": False,
+        "dedupe_media": False,
+        "profile": False,
+        "quarantine": False,
+        "use_osu_db": use_osu_db,
+        "dry_run": False,
+    }
+
+
+def run_suite(work_dir: Path, spec: LibrarySpec, repeat: int, workers: int) -> list[BenchmarkResult]:
+    counter = _FsCallCounter()
+    pristine = work_dir / "pristine"
+    generate_library(pristine, spec)
+    folders = sorted(p for p in pristine.iterdir() if p.is_dir())
+    # Next to every copy of the library, where osu! keeps it.
+    write_osu_db(pristine, work_dir / "osu!.db")
+    copies = 0
+
+    def fresh_copy() -> Path:
+        nonlocal copies
+        copies += 1
+        target = work_dir / f"run{copies}"
+        shutil.copytree(pristine, target, symlinks=True)
+        return target
+
+    marathon = work_dir / "marathon.osu"
+    build_marathon_map(marathon, 30000, 2000)
+
+    def parse_file(_):
+        for _ in range(20):
+            OSUParser.parse_file(marathon)
+
+    def parse_folder(_):
+        for folder in folders:
+            OSUParser.parse_folder(folder, [])
+
+    def folder_cleaner(songs: object):
+        assert isinstance(songs, Path)
+        params = _params(1)
+        for folder in sorted(songs.iterdir()):
+            PlanExecutor.execute(_FolderCleaner(folder, params).plan())
+
+    def start_clean(songs: object):
+        assert isinstance(songs, Path)
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            Cleaner(songs, _params(workers), lambda snapshot: None).start_clean()
+
+    def start_clean_osu_db(songs: object):
+        assert isinstance(songs, Path)
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            Cleaner(songs, _params(workers, use_osu_db=True), lambda snapshot: None).start_clean()
+
+    return [
+        measure("parse_file (marathon map, 20x)", lambda: None, parse_file, repeat, counter),
+        measure("parse_folder (whole library)", lambda: None, parse_folder, repeat, counter),
+        measure("_FolderCleaner.plan + execute", fresh_copy, folder_cleaner, repeat, counter),
+        measure(f"Cleaner.start_clean ({workers} workers)", fresh_copy, start_clean, repeat, counter),
+        measure("Cleaner.start_clean + osu!.db", fresh_copy, start_clean_osu_db, repeat, counter),
+    ]
+
+
+def _change(new: float, old: float) -> str:
+    return f"{(new - old) / old:+.1%}" if old else "n/a"
+
+
+def compare(results: list[BenchmarkResult], baseline: dict, threshold: float) -> bool:
+    """Prints the results next to the baseline. Returns whether anything regressed."""
+    old_results = {r["name"]: r for r in baseline["results"]}
+    regressed = False
+    print(f"{'benchmark':<36} {'wall':>10} {'vs base':>9} {'fs calls':>9} {'vs base':>9} {'peak MiB':>9} {'vs base':>9}")
+    for result in results:
+        old = old_results.get(result.name)
+        if old is None:
+            print(f"{result.name:<36} {result.wall_s:>9.3f}s (not in baseline)")
+            continue
+        old_fs = sum(old["fs_calls"].values())
+        flags = []
+        if result.wall_s > old["wall_s"] * (1 + threshold):
+            flags.append("time")
+        # The tree is the same on every run, so any extra call is a real change.
+        if result.total_fs_calls > old_fs:
+            flags.append("fs calls")
+        if result.peak_memory > old["peak_memory"] * (1 + threshold):
+            flags.append("memory")
+        regressed = regressed or bool(flags)
+        print(
+            f"{result.name:<36} {result.wall_s:>9.3f}s {_change(result.wall_s, old['wall_s']):>9} "
+            f"{result.total_fs_calls:>9} {_change(result.total_fs_calls, old_fs):>9} "
+            f"{result.peak_memory / 2**20:>9.1f} {_change(result.peak_memory, old['peak_memory']):>9}"
+            + (f"  REGRESSED: {', '.join(flags)}" if flags else "")
+        )
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parser and the cleaner on a generated library.")
+    parser.add_argument("--mapsets", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=LibrarySpec.seed)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--work-dir", type=Path, help="where to generate the libraries (default: a temp dir)")
+    parser.add_argument(
+        "--save-baseline", nargs="?", type=Path, const=_DEFAULT_BASELINE, metavar="PATH",
+        help=f"store the results as the baseline (default: {_DEFAULT_BASELINE.name})"
+    )
+    parser.add_argument(
+        "--compare", nargs="?", type=Path, const=_DEFAULT_BASELINE, metavar="PATH",
+        help="compare the results with a stored baseline; exits with 1 on a regression"
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=0.15, help="allowed slowdown/memory growth (default: 0.15)"
+    )
+    args = parser.parse_args()
+
+    spec = LibrarySpec(mapsets=args.mapsets, seed=args.seed)
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as tmp_dir:
+        results = run_suite(Path(tmp_dir), spec, args.repeat, args.workers)
+
+    data = {
+        "spec": {"mapsets": spec.mapsets, "seed": spec.seed},
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": [asdict(r) for r in results],
+    }
+
+    regressed = False
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        if baseline["spec"] != data["spec"]:
+            print(f"Warning: the baseline was made with a different library: {baseline['spec']}")
+        regressed = compare(results, baseline, args.threshold)
+    else:
+        for result in results:
+            print(
+                f"{result.name:<36} {result.wall_s:>9.3f}s {result.total_fs_calls:>9} fs calls "
+                f"{result.peak_memory / 2**20:>9.1f} MiB peak"
+            )
+
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(data, indent=4), encoding="utf-8")
+        print(f"Baseline saved to {args.save_baseline}")
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
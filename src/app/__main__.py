@@ -0,0 +1,393 @@
+import argparse
+import json
+import sys
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+from threading import Event
+
+from ..exceptions import CleanError, OSUParsingError
+from .archive import ColdStorage
+from .cleaner import Cleaner
+from .file_utils import format_size
+from .progress import ProgressReporter, ProgressSnapshot
+from .quarantine import Quarantine
+from .shrink import DEFAULT_MAX_SIZE, DEFAULT_QUALITY, is_qt_available
+from .types import CleanerParams, OSUGameModes
+from .watcher import SongsWatcher
+
+# Headless command-line entry point. It only imports `src.app` modules, so it
+# starts without loading PyQt and can be scheduled to run unattended:
+#
+#     python -m src.app clean "C:/osu!/osu!.exe" --delete-modes taiko catch mania
+#
+# Progress is written to stderr and a JSON summary of the run to stdout.
+#
+# `watch` keeps running and cleans mapsets as they are imported, printing one
+# JSON summary line per batch, until it is stopped with Ctrl+C.
+#
+# `archive` packs mapsets that haven't been played for a while into .osz files
+# outside of Songs, and brings them back with `--restore`.
+
+_ASSETS_PATH = Path(__file__).resolve().parents[2] / "assets"
+
+_MODES = {
+    "osu": OSUGameModes.OSU,
+    "taiko": OSUGameModes.TAIKO,
+    "catch": OSUGameModes.CATCH,
+    "mania": OSUGameModes.MANIA,
+}
+
+
+class _ProgressPrinter:
+    """Prints a single, periodically refreshed progress line to stderr."""
+    INTERVAL = 0.5
+    # The phases that go over every folder, and so get an ETA.
+    FOLDER_PHASES = ("cleaning", "archiving")
+
+    def __init__(self):
+        self.last: ProgressSnapshot | None = None
+        self._last_print = 0.0
+
+    def __call__(self, snapshot: ProgressSnapshot):
+        new_phase = self.last is None or self.last.phase != snapshot.phase
+        self.last = snapshot
+        # Snapshots arrive at up to 10 Hz; a terminal doesn't need that many.
+        now = time.monotonic()
+        if now - self._last_print < self.INTERVAL and not new_phase:
+            return
+        self._last_print = now
+        total = snapshot.total if snapshot.total is not None else "?"
+        line = (
+            f"\r[{snapshot.phase}] {snapshot.done}/{total}  {snapshot.folders_per_s:.0f} folders/s  "
+            f"{format_size(snapshot.bytes_freed)} in {snapshot.files_deleted} files"
+        )
+        if snapshot.eta_s is not None and snapshot.phase in self.FOLDER_PHASES:
+            line += f"  ETA {int(snapshot.eta_s)}s"
+        # Only the per-folder line is refreshed in place; the other phases get a line
+        # of their own, so the cleaner's messages don't run into them.
+        end = "" if snapshot.phase in self.FOLDER_PHASES else "\n"
+        print(line.ljust(80), end=end, file=sys.stderr, flush=True)
+
+    def finish(self):
+        if self.last is not None and self.last.phase in self.FOLDER_PHASES:
+            print(file=sys.stderr)
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m src.app", description="sh(x)cleaner without the GUI.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    clean = commands.add_parser("clean", help="clean the Songs folder")
+    clean.add_argument("path", type=Path, help="path to osu!.exe or directly to the Songs folder")
+    _add_clean_options(clean)
+    # Not for `watch`: every batch is a run of its own, so forcing it would reset
+    # the processed index to that batch.
+    clean.add_argument("--force-clean", action="store_true", help="ignore processed folders")
+    clean.add_argument("--dry-run", action="store_true", help="only write the deletion plan, delete nothing")
+
+    watch = commands.add_parser("watch", help="keep cleaning new beatmap folders as they are imported")
+    watch.add_argument("path", type=Path, help="path to osu!.exe or directly to the Songs folder")
+    _add_clean_options(watch)
+    watch.add_argument(
+        "--settle", type=float, default=10.0,
+        help="seconds a new folder must stay unchanged before it is cleaned (default: 10)"
+    )
+    watch.add_argument("--interval", type=float, default=2.0, help="seconds between checks (default: 2)")
+    watch.add_argument(
+        "--rescan", type=float, default=60.0,
+        help="seconds between checks for changes inside existing folders (default: 60)"
+    )
+    watch.set_defaults(force_clean=False, dry_run=False)
+
+    quarantine = commands.add_parser("quarantine", help="list, restore or purge quarantined folders")
+    quarantine.add_argument("path", type=Path, help="path to osu!.exe or directly to the Songs folder")
+    action = quarantine.add_mutually_exclusive_group()
+    action.add_argument("--restore", nargs="+", default=[], metavar="FOLDER", help="move folders back into Songs")
+    action.add_argument("--purge", action="store_true", help="delete everything in quarantine now")
+
+    archive = commands.add_parser("archive", help="move rarely played beatmap folders into .osz archives, or restore them")
+    archive.add_argument("path", type=Path, help="path to osu!.exe or directly to the Songs folder")
+    action = archive.add_mutually_exclusive_group()
+    action.add_argument(
+        "--older-than", type=float, metavar="DAYS",
+        help="archive folders with no activity for this many days"
+    )
+    action.add_argument("--restore", nargs="+", default=[], metavar="FOLDER", help="unpack folders back into Songs")
+    archive.add_argument(
+        "--rule", choices=["played", "modified"], default="played",
+        help="activity is when a map was last played according to osu!.db (default; never played maps "
+             "fall back to 'modified'), or when its .osu files were last changed"
+    )
+    archive.add_argument(
+        "--archive-dir", type=Path,
+        help="where to put the archives (default: a 'sh(x)cleaner-archive' folder next to Songs)"
+    )
+    archive.add_argument("--workers", type=int, default=4, help="folders archived at the same time (default: 4)")
+    archive.add_argument("--dry-run", action="store_true", help="only list the folders that would be archived")
+    return parser
+
+
+def _add_clean_options(command: argparse.ArgumentParser):
+    """The options shared by `clean` and `watch`."""
+    command.add_argument(
+        "--delete-modes", nargs="+", choices=list(_MODES), default=[], metavar="MODE",
+        help=f"game modes to delete ({', '.join(_MODES)})"
+    )
+    command.add_argument(
+        "--backgrounds", choices=["keep", "dedupe", "shrink", "white", "custom", "delete"], default="keep",
+        help="what to do with backgrounds (default: keep); dedupe keeps them, storing identical ones once; "
+             "shrink keeps them, downscaled and re-encoded"
+    )
+    command.add_argument(
+        "--shrink-size", type=_resolution, default=DEFAULT_MAX_SIZE, metavar="WxH",
+        help="largest background resolution, for --backgrounds shrink (default: 1920x1080)"
+    )
+    command.add_argument(
+        "--shrink-quality", type=int, default=DEFAULT_QUALITY,
+        help=f"JPEG quality of shrunk backgrounds, for --backgrounds shrink (default: {DEFAULT_QUALITY})"
+    )
+    command.add_argument("--png", type=Path, help="custom PNG background, for --backgrounds custom")
+    command.add_argument("--jpg", type=Path, help="custom JPEG background, for --backgrounds custom")
+    command.add_argument("--keep-videos", action="store_true", help="keep background videos")
+    command.add_argument("--ignore-id-limit", action="store_true", help="process folders with IDs of 9+ digits")
+    command.add_argument(
+        "--dangerous-clean", action="store_true", help="also clean folders with no numeric ID (use with caution!)"
+    )
+    command.add_argument(
+        "--dedupe-mapsets", action="store_true",
+        help="also delete folders that hold the same mapset as another folder, whatever their names"
+    )
+    command.add_argument(
+        "--dedupe-media", action="store_true",
+        help="hard-link identical kept audio and video files across folders, storing them once"
+    )
+    command.add_argument(
+        "--no-osu-db", action="store_true",
+        help="don't use osu!.db to skip parsing difficulties of deleted modes"
+    )
+    command.add_argument("--workers", type=int, default=4, help="number of worker threads (default: 4)")
+    command.add_argument(
+        "--profile", action="store_true", help="add cProfile and tracemalloc results to clean_report.json"
+    )
+    command.add_argument(
+        "--quarantine", action="store_true",
+        help="move removed folders to a quarantine folder next to Songs; they are deleted by the next run"
+    )
+
+
+def _resolution(value: str) -> tuple[int, int]:
+    """Parses a `--shrink-size` like `1920x1080`."""
+    width, _, height = value.lower().partition("x")
+    try:
+        return int(width), int(height)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, e.g. 1920x1080, not {value!r}")
+
+
+def _resolve_songs_folder(path: Path) -> Path:
+    """Accepts either `osu!.exe` (like the GUI) or the Songs folder itself."""
+    if path.is_dir():
+        return path.resolve()
+    if path.name.lower() != "osu!.exe":
+        raise ValueError("You must select the osu!.exe file or the Songs folder.")
+    songs_folder = path.parent / "Songs"
+    if not songs_folder.is_dir():
+        raise ValueError("Could not find the 'Songs' folder in the same directory as osu!.exe.")
+    return songs_folder.resolve()
+
+
+def _build_params(args: argparse.Namespace) -> CleanerParams:
+    """The CLI counterpart of `SHXCleanerApp.pick_params`."""
+    user_images: dict[str, str | Path] | None = None
+    if args.backgrounds == "white":
+        user_images = {
+            ".png": _ASSETS_PATH / "white.png",
+            ".jpg": _ASSETS_PATH / "white.jpg",
+            ".jpeg": _ASSETS_PATH / "white.jpg"
+        }
+    elif args.backgrounds == "custom":
+        user_images = {}
+        if args.png:
+            user_images[".png"] = args.png
+        if args.jpg:
+            user_images[".jpg"] = args.jpg
+            user_images[".jpeg"] = args.jpg
+        if not user_images:
+            raise ValueError("--backgrounds custom needs --png and/or --jpg.")
+
+    if args.backgrounds == "shrink" and not is_qt_available():
+        raise ValueError("--backgrounds shrink needs PyQt6, install it with `pip install PyQt6`.")
+
+    delete_modes = [_MODES[mode] for mode in dict.fromkeys(args.delete_modes)]
+    # The same safeguard as in the GUI.
+    if len(delete_modes) == len(_MODES):
+        raise ValueError("You can delete your songs folder manually if you want to.")
+
+    return {
+        "user_images": user_images,
+        "delete_images": args.backgrounds == "delete",
+        "delete_modes": delete_modes,
+        "force_clean": args.force_clean,
+        "keep_videos": args.keep_videos,
+        "ignore_id_limit": args.ignore_id_limit,
+        "dangerous_clean_no_id": args.dangerous_clean,
+        "workers": max(1, args.workers),
+        "dedupe_backgrounds": args.backgrounds == "dedupe",
+        "shrink_backgrounds": args.backgrounds == "shrink",
+        "shrink_max_size": args.shrink_size,
+        "shrink_quality": max(1, min(100, args.shrink_quality)),
+        "dedupe_mapsets": args.dedupe_mapsets,
+        "dedupe_media": args.dedupe_media,
+        "profile": args.profile,
+        "dry_run": args.dry_run,
+        "quarantine": args.quarantine,
+        "use_osu_db": not args.no_osu_db,
+    }
+
+
+def _clean(args: argparse.Namespace) -> int:
+    try:
+        songs_folder = _resolve_songs_folder(args.path)
+        params = _build_params(args)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    start = time.perf_counter()
+    progress = _ProgressPrinter()
+    try:
+        # The cleaner's diagnostics are printed; keep stdout for the JSON summary.
+        with redirect_stdout(sys.stderr):
+            cleaner = Cleaner(songs_folder, params, progress)
+            cleaner.start_clean()
+    except (CleanError, OSUParsingError) as e:
+        progress.finish()
+        print(f"An error occurred:\n{e}", file=sys.stderr)
+        return 1
+    progress.finish()
+
+    cache = cleaner.metadata_cache
+    summary = {
+        "songs_folder": str(songs_folder),
+        "dry_run": cleaner.dry_run,
+        "folders": progress.last.done if progress.last is not None else 0,
+        "elapsed_s": round(time.perf_counter() - start, 3),
+        "totals": cleaner.plan_totals.to_json(),
+        "metadata_cache": {"hits": cache.hits, "misses": cache.misses},
+    }
+    if cleaner.dry_run:
+        summary["plan"] = str(cleaner.plan_path)
+    if cleaner.quarantine is not None:
+        summary["quarantine"] = str(cleaner.quarantine.batch)
+    summary["report"] = str(cleaner.report_path)
+    print(json.dumps(summary, indent=4))
+    return 0
+
+
+def _watch(args: argparse.Namespace) -> int:
+    try:
+        songs_folder = _resolve_songs_folder(args.path)
+        params = _build_params(args)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    summaries = sys.stdout
+
+    def on_batch(cleaner: Cleaner, folders: list[Path]):
+        summary = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "folders": [folder.name for folder in folders],
+            "totals": cleaner.plan_totals.to_json(),
+        }
+        print(json.dumps(summary, ensure_ascii=False), file=summaries, flush=True)
+
+    watcher = SongsWatcher(
+        songs_folder, params, lambda snapshot: None, on_batch,
+        settle_delay=args.settle, poll_interval=args.interval, rescan_interval=args.rescan
+    )
+    print(f"Watching {songs_folder}, press Ctrl+C to stop.", file=sys.stderr)
+    try:
+        with redirect_stdout(sys.stderr):
+            watcher.run(Event())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def _quarantine(args: argparse.Namespace) -> int:
+    """Prints what is left in quarantine, by batch, after restoring or purging."""
+    try:
+        quarantine = Quarantine(_resolve_songs_folder(args.path))
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    status = 0
+    for name in args.restore:
+        try:
+            print(f"Restored {quarantine.restore(name)}", file=sys.stderr)
+        except OSError as e:
+            print(f"Could not restore {name}: {e}", file=sys.stderr)
+            status = 1
+    if args.purge:
+        with redirect_stdout(sys.stderr):
+            quarantine.purge()
+
+    print(json.dumps(quarantine.contents(), indent=4, ensure_ascii=False))
+    return status
+
+
+def _archive(args: argparse.Namespace) -> int:
+    """Archives or restores folders, then prints what is archived, or what would be in a dry run."""
+    try:
+        songs_folder = _resolve_songs_folder(args.path)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    storage = ColdStorage(songs_folder, args.archive_dir)
+
+    status = 0
+    for name in args.restore:
+        try:
+            print(f"Restored {storage.restore(name)}", file=sys.stderr)
+        except OSError as e:
+            print(f"Could not restore {name}: {e}", file=sys.stderr)
+            status = 1
+
+    if args.older_than is not None:
+        try:
+            folders = storage.select(args.older_than, args.rule, songs_folder.parent / "osu!.db")
+        except Exception as e:
+            print(f"Could not select the folders to archive: {e}", file=sys.stderr)
+            return 1
+        progress = _ProgressPrinter()
+        with redirect_stdout(sys.stderr):
+            entries = storage.archive(folders, args.workers, ProgressReporter(progress), args.dry_run)
+        progress.finish()
+        if args.dry_run:
+            print(json.dumps(entries, indent=4, ensure_ascii=False))
+            return status
+        if len(entries) < len(folders) or any("leftover" in entry for entry in entries):
+            status = 1
+
+    print(json.dumps(storage.entries(), indent=4, ensure_ascii=False))
+    return status
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _build_parser().parse_args(argv)
+    if args.command == "clean":
+        return _clean(args)
+    if args.command == "watch":
+        return _watch(args)
+    if args.command == "quarantine":
+        return _quarantine(args)
+    if args.command == "archive":
+        return _archive(args)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+import json
+import os
+import shutil
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from threading import Lock
+from typing import Literal
+
+from .cleaner import RESERVED_FOLDER_NAMES
+from .file_utils import atomic_write_text
+from .folder_inventory import FolderInventory
+from .osu_db import last_played_by_folder
+from .progress import ProgressReporter
+
+# Next to the Songs folder, like the quarantine, so osu! doesn't import the archives back.
+ARCHIVE_FOLDER_NAME = "sh(x)cleaner-archive"
+# An archived folder is renamed to this in Songs before it is deleted.
+STAGING_SUFFIX = ".shx-archive"
+# Formats that are compressed already: deflating them again costs CPU and saves nothing.
+COMPRESSED_EXTENSIONS = frozenset({
+    ".mp3", ".ogg", ".jpg", ".jpeg", ".png", ".gif",
+    ".mp4", ".avi", ".flv", ".wmv", ".m4v", ".mkv", ".mov", ".mpg", ".mpeg", ".webm", ".zip", ".osz",
+})
+
+SelectionRule = Literal["played", "modified"]
+
+
+class ColdStorage:
+    """
+    Archives rarely played beatmap folders as .osz files, outside of the Songs
+    folder, so osu! (and the cleaner) have fewer folders to go through on every
+    refresh and rescan.
+
+    Each folder is packed into `<folder name>.osz`, the same zip format osu!
+    imports, so an archive can also be brought back by simply dropping it into
+    osu!. Files are streamed into the archive one chunk at a time; formats that
+    are compressed already are stored as they are. Folders are packed on a
+    pool of threads, since zlib and file I/O release the GIL.
+
+    Every archived folder gets a line in `manifest.jsonl` in the archive
+    folder, which `restore` uses to unpack it back into Songs. The line is
+    written once the archive is complete and the folder has been renamed to
+    `<folder name>.shx-archive`, and only then is that deleted: a folder that
+    can't be renamed (e.g. a file in it is in use) is never recorded, and one
+    that can't be fully deleted afterwards is still archived, leaving only
+    files to delete by hand.
+    """
+    MANIFEST_FILENAME = "manifest.jsonl"
+
+    songs_folder: Path
+    root: Path
+    manifest_path: Path
+    _lock: Lock
+
+    def __init__(self, songs_folder: Path, root: Path | None = None):
+        self.songs_folder = songs_folder
+        self.root = root if root is not None else songs_folder.parent / ARCHIVE_FOLDER_NAME
+        self.manifest_path = self.root / self.MANIFEST_FILENAME
+        self._lock = Lock()
+
+    def select(
+        self,
+        older_than_days: float,
+        rule: SelectionRule = "played",
+        db_path: Path | None = None
+    ) -> list[tuple[Path, int]]:
+        """
+        The beatmap folders with no activity for `older_than_days`, with the
+        time of their last activity in nanoseconds since the Unix epoch, oldest
+        first.
+
+        With the "modified" rule, a folder's last activity is when its newest
+        .osu file was changed (the folder's own mtime also changes whenever
+        the cleaner deletes something in it). With "played", it is when any of
+        its difficulties was last played according to `osu!.db` at `db_path`;
+        folders that were never played fall back to the "modified" rule, so
+        freshly imported maps are left alone.
+        """
+        last_played: dict[str, int] = {}
+        if rule == "played":
+            if db_path is None or not db_path.is_file():
+                raise FileNotFoundError(f"osu!.db not found at {db_path}")
+            last_played = last_played_by_folder(db_path)
+
+        cutoff = time.time_ns() - int(older_than_days * 86400 * 1_000_000_000)
+        selected: list[tuple[Path, int]] = []
+        with os.scandir(self.songs_folder) as it:
+            for entry in it:
+                if entry.name in RESERVED_FOLDER_NAMES or not entry.is_dir(follow_symlinks=False):
+                    continue
+                if entry.name.endswith(STAGING_SUFFIX):
+                    continue  # Left partly deleted by an earlier archive run.
+                if Path(entry.path) == self.root:
+                    continue  # The archive folder was put inside Songs.
+                activity = last_played.get(entry.name.lower())
+                if activity is None:
+                    activity = self.__newest_difficulty_ns(entry.path)
+                if activity is not None and activity < cutoff:
+                    selected.append((Path(entry.path), activity))
+        return sorted(selected, key=lambda item: item[1])
+
+    def archive(
+        self,
+        folders: list[tuple[Path, int]],
+        workers: int = 4,
+        progress: ProgressReporter | None = None,
+        dry_run: bool = False
+    ) -> list[dict]:
+        """
+        Archives the folders returned by `select` and returns their manifest
+        entries. A folder that can't be archived is reported and left in
+        place. A folder that was archived but couldn't be fully deleted is
+        reported too, and its entry names what is left of it in `leftover`.
+        In a dry run nothing is written; the entries only tell what would be
+        archived.
+        """
+        if progress is not None:
+            progress.set_total(len(folders))
+            progress.set_phase("archiving")
+        entries: list[dict] = []
+        if not dry_run:
+            self.root.mkdir(parents=True, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="archiver") as pool:
+            futures = [pool.submit(self.__archive_folder, folder, activity, dry_run) for folder, activity in folders]
+            for future in futures:
+                entry = future.result()
+                if entry is not None:
+                    entries.append(entry)
+                if progress is not None:
+                    progress.step(-1, entry["size"] if entry else 0, entry["files"] if entry else 0)
+        if progress is not None:
+            progress.finish()
+        return entries
+
+    def entries(self) -> list[dict]:
+        """The archived folders, latest entry per folder, in the order they were archived."""
+        if not self.manifest_path.exists():
+            return []
+        by_folder: dict[str, dict] = {}
+        with open(self.manifest_path, 'r', encoding='utf-8') as manifest_file:
+            for line in manifest_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Torn by a crash in the middle of a write.
+                by_folder.pop(entry["folder"], None)
+                by_folder[entry["folder"]] = entry
+        return list(by_folder.values())
+
+    def restore(self, name: str) -> Path:
+        """
+        Unpacks an archived folder back into Songs and deletes its archive.
+        Raises `FileNotFoundError` if it isn't archived and `FileExistsError`
+        if Songs already has a folder of that name.
+        """
+        entries = self.entries()
+        entry = next((e for e in entries if e["folder"] == name), None)
+        if entry is None or not (self.root / entry["archive"]).exists():
+            raise FileNotFoundError(f"{name} is not archived")
+        target = self.songs_folder / name
+        if target.exists():
+            raise FileExistsError(f"{target} already exists")
+
+        # Unpacked next to its final place and renamed, so osu! never sees half a folder.
+        temp = self.songs_folder / (name + ".shx-restore")
+        shutil.rmtree(temp, ignore_errors=True)
+        with zipfile.ZipFile(self.root / entry["archive"]) as archive:
+            archive.extractall(temp)
+        os.rename(temp, target)
+
+        (self.root / entry["archive"]).unlink()
+        with self._lock:
+            remaining = [e for e in entries if e["folder"] != name]
+            atomic_write_text(
+                self.manifest_path, "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in remaining)
+            )
+        return target
+
+    @staticmethod
+    def __newest_difficulty_ns(folder: str) -> int | None:
+        newest = None
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if entry.name.lower().endswith(".osu") and entry.is_file():
+                        mtime = entry.stat().st_mtime_ns
+                        newest = mtime if newest is None else max(newest, mtime)
+        except OSError:
+            return None
+        return newest
+
+    def __archive_folder(self, folder: Path, activity: int, dry_run: bool) -> dict | None:
+        """Archives one folder. A failure is reported and doesn't stop the other folders."""
+        temp_path: Path | None = None
+        archive_path = self.root / (folder.name + ".osz")
+        staging_path = folder.with_name(folder.name + STAGING_SUFFIX)
+        archive_done = False
+        try:
+            inventory = FolderInventory(folder)
+            entry = {
+                "folder": folder.name,
+                "archive": archive_path.name,
+                "files": len(inventory.files),
+                "size": sum(f.size for f in inventory.files),
+                "last_activity": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(activity / 1e9)),
+                "archived_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }
+            if dry_run:
+                return entry
+
+            temp_path = archive_path.with_name(archive_path.name + ".tmp")
+            # Files dated before 1980, which zip can't represent, are stored as 1980.
+            with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED, strict_timestamps=False) as archive:
+                for file in inventory.files:
+                    stored = os.path.splitext(file.rel_path)[1].lower() in COMPRESSED_EXTENSIONS
+                    # Links (e.g. to shared backgrounds) are archived as the files they point to.
+                    archive.write(
+                        file.path, file.rel_path,
+                        compress_type=zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+                    )
+                # Other directories are implied by the paths of their files.
+                for directory in inventory.dirs:
+                    if inventory.is_empty(directory.rel_path):
+                        archive.writestr(directory.rel_path + "/", b"")
+            entry["archive_size"] = temp_path.stat().st_size
+            os.replace(temp_path, archive_path)
+            archive_done = True
+
+            # A single rename, so the folder is either still whole or out of osu!'s way.
+            os.rename(folder, staging_path)
+            try:
+                # Logged before the folder is deleted, so an archived folder is never lost.
+                with self._lock, open(self.manifest_path, 'a', encoding='utf-8', newline='\n') as manifest_file:
+                    manifest_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            except Exception:
+                os.rename(staging_path, folder)
+                raise
+        except Exception as e:
+            print(f"Could not archive {folder}: {e}")
+            if temp_path is not None:
+                temp_path.unlink(missing_ok=True)
+            if archive_done:
+                archive_path.unlink(missing_ok=True)
+            return None
+
+        try:
+            shutil.rmtree(staging_path)
+        except OSError as e:
+            print(f"{folder.name} was archived, but {staging_path} could not be fully deleted: {e}")
+            entry = {**entry, "leftover": str(staging_path)}
+        return entry
@@ -0,0 +1,407 @@
+import os
+import shutil
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+
+from ..exceptions import CleanError
+from .folder_inventory import FolderInventory, InventoryFile
+from .instrumentation import PhaseTimer
+from .osu_parser import OSUFile
+from .quarantine import Quarantine
+
+
+class ActionKind(Enum):
+    """The kinds of filesystem changes the cleaner can make."""
+    UNLINK = "unlink"
+    """Delete a single junk file."""
+    RMDIR = "rmdir"
+    """Remove a subdirectory that the planned deletions leave empty."""
+    RMTREE = "rmtree"
+    """Delete a whole beatmap folder that has nothing left worth keeping."""
+    SYMLINK = "symlink"
+    """Replace a background image with a link to a shared image."""
+    DUPLICATE = "duplicate"
+    """Delete a whole beatmap folder whose beatmap ID was already kept."""
+    STORE = "store"
+    """Move a background into the shared background store and link to it in its place."""
+    HARDLINK = "hardlink"
+    """Replace a kept audio or video file with a hard link to an identical file in another folder."""
+    SHRINK = "shrink"
+    """Replace a background with a downscaled and re-encoded version of it, written next to it beforehand."""
+
+
+class SpaceCategory(Enum):
+    """What the space freed by an action was used for, to show which options pay off."""
+    HITSOUNDS = "hitsounds"
+    """Audio files no difficulty uses as its song: hitsounds and other sound samples."""
+    VIDEOS = "videos"
+    STORYBOARDS = "storyboards"
+    """.osb files and the images that aren't backgrounds or skin elements, i.e. storyboard sprites."""
+    SKIN = "skin"
+    """Beatmap skin elements: `skin.ini` and images named like skin elements."""
+    REMOVED_MODES = "removed_modes"
+    """Difficulties of deleted game modes, and whole folders left without a difficulty to keep."""
+    DUPLICATES = "duplicates"
+    """Folders removed as duplicates of another folder, and audio and video files hard-linked to a copy."""
+    BACKGROUNDS = "backgrounds"
+    """Background images that were deleted, replaced, deduplicated or shrunk."""
+    OTHER = "other"
+
+
+# The category of actions whose kind alone says what they free.
+_KIND_CATEGORIES = {
+    ActionKind.RMTREE: SpaceCategory.REMOVED_MODES,
+    ActionKind.DUPLICATE: SpaceCategory.DUPLICATES,
+    ActionKind.HARDLINK: SpaceCategory.DUPLICATES,
+    ActionKind.SYMLINK: SpaceCategory.BACKGROUNDS,
+    ActionKind.STORE: SpaceCategory.BACKGROUNDS,
+    ActionKind.SHRINK: SpaceCategory.BACKGROUNDS,
+}
+
+
+@dataclass
+class CleanAction:
+    """A single planned filesystem change."""
+
+    kind: ActionKind
+    path: str
+    """The file or directory the action applies to."""
+    size: int = 0
+    """The number of bytes the action frees, taken from the folder's inventory."""
+    target: str | None = None
+    """
+    For `SYMLINK` and `STORE`: the shared image the link points to. For
+    `HARDLINK`: the identical file to link to. For `SHRINK`: the shrunk image.
+    """
+    replaces: str | None = None
+    """For `SYMLINK`: the existing file the link replaces, as it is named on disk."""
+    category: SpaceCategory | None = None
+    """For `UNLINK`: what kind of file is deleted. Other kinds imply their category, see `space_category`."""
+
+    @property
+    def space_category(self) -> SpaceCategory | None:
+        """What the freed space was used for, or `None` for actions that free nothing (`RMDIR`)."""
+        if self.category is not None:
+            return self.category
+        if self.kind is ActionKind.UNLINK:
+            return SpaceCategory.OTHER
+        return _KIND_CATEGORIES.get(self.kind)
+
+    def to_json(self) -> dict:
+        data: dict = {"kind": self.kind.value, "path": self.path, "size": self.size}
+        if self.target is not None:
+            data["target"] = self.target
+        if self.replaces is not None:
+            data["replaces"] = self.replaces
+        if self.category is not None:
+            data["category"] = self.category.value
+        return data
+
+    @classmethod
+    def from_json(cls, data: dict) -> "CleanAction":
+        category = SpaceCategory(data["category"]) if "category" in data else None
+        return cls(
+            ActionKind(data["kind"]), data["path"], data.get("size", 0),
+            data.get("target"), data.get("replaces"), category
+        )
+
+
+@dataclass
+class FolderPlan:
+    """Everything the cleaner intends to do to a single beatmap folder."""
+
+    folder: Path
+    actions: list[CleanAction]
+    keeps_folder: bool
+    """Whether the folder still exists once the plan has been applied."""
+    inventory: FolderInventory | None = None
+    """The scan the plan was made from, reused by the executor to delete whole folders."""
+    images: list[InventoryFile] = field(default_factory=list)
+    """The background images the folder keeps, collected for "Keep + Dedupe"."""
+    difficulties: list[tuple[InventoryFile, OSUFile]] = field(default_factory=list)
+    """The difficulties the folder keeps, collected to find duplicate mapsets."""
+    media: list[InventoryFile] = field(default_factory=list)
+    """The audio and video files the folder keeps, collected to hard-link identical copies."""
+
+    @classmethod
+    def remove(cls, folder: Path, inventory: FolderInventory, kind: ActionKind) -> "FolderPlan":
+        """A plan that deletes the whole folder (`RMTREE` or `DUPLICATE`)."""
+        size = sum(f.size for f in inventory.files)
+        return cls(folder, [CleanAction(kind, str(folder), size)], False, inventory)
+
+    @property
+    def size(self) -> int:
+        return sum(action.size for action in self.actions)
+
+    @property
+    def files_removed(self) -> int:
+        """The number of files the plan deletes, counting every file of a removed folder."""
+        count = 0
+        for action in self.actions:
+            if action.kind is ActionKind.UNLINK:
+                count += 1
+            elif action.kind in (ActionKind.RMTREE, ActionKind.DUPLICATE) and self.inventory is not None:
+                count += len(self.inventory.files)
+        return count
+
+
+@dataclass
+class PlanTotals:
+    """Running totals over all planned (or executed) actions of a run."""
+
+    bytes: dict[ActionKind, int] = field(default_factory=lambda: dict.fromkeys(ActionKind, 0))
+    counts: dict[ActionKind, int] = field(default_factory=lambda: dict.fromkeys(ActionKind, 0))
+    folders_removed: int = 0
+    category_bytes: dict[SpaceCategory, int] = field(default_factory=lambda: dict.fromkeys(SpaceCategory, 0))
+    category_files: dict[SpaceCategory, int] = field(default_factory=lambda: dict.fromkeys(SpaceCategory, 0))
+    """The files deleted or replaced per category, counting every file of a removed folder."""
+
+    def add(self, plan: FolderPlan):
+        for action in plan.actions:
+            self.bytes[action.kind] += action.size
+            self.counts[action.kind] += 1
+            category = action.space_category
+            if category is None:
+                continue
+            # Sizes come from the plan's inventory, so this costs no extra stat calls.
+            self.category_bytes[category] += action.size
+            if action.kind in (ActionKind.RMTREE, ActionKind.DUPLICATE):
+                self.category_files[category] += len(plan.inventory.files) if plan.inventory is not None else 0
+            elif action.replaces is not None or action.kind in (
+                ActionKind.UNLINK, ActionKind.HARDLINK, ActionKind.SHRINK
+            ):
+                self.category_files[category] += 1
+        if not plan.keeps_folder:
+            self.folders_removed += 1
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self.bytes.values())
+
+    def reclaimed_by_category(self) -> list[tuple[SpaceCategory, int, int]]:
+        """The categories that freed anything, largest first, with their bytes and files."""
+        reclaimed = [
+            (category, self.category_bytes[category], self.category_files[category])
+            for category in SpaceCategory if self.category_bytes[category] or self.category_files[category]
+        ]
+        return sorted(reclaimed, key=lambda item: item[1], reverse=True)
+
+    def to_json(self) -> dict:
+        return {
+            "bytes": {kind.value: size for kind, size in self.bytes.items()},
+            "counts": {kind.value: count for kind, count in self.counts.items()},
+            "total_bytes": self.total_bytes,
+            "folders_removed": self.folders_removed,
+            "categories": {
+                category.value: {"bytes": self.category_bytes[category], "files": self.category_files[category]}
+                for category in SpaceCategory
+            },
+        }
+
+
+@dataclass
+class _ActionTiming:
+    """The time spent on one kind of action while executing a plan."""
+    seconds: float = 0.0
+    calls: int = 0
+
+
+class PlanExecutor:
+    """
+    Applies a `FolderPlan` to disk.
+
+    Since the whole plan for a folder is known up front, the executor is free
+    to order the I/O: file deletions go first, sorted by path so entries of
+    the same directory are removed together, then emptied directories are
+    removed deepest first, and backgrounds and media are linked last.
+
+    With a `Quarantine`, whole folders are moved into it instead of being
+    deleted.
+    """
+    _ORDER = {
+        ActionKind.UNLINK: 0,
+        ActionKind.RMDIR: 1,
+        ActionKind.RMTREE: 2,
+        ActionKind.DUPLICATE: 2,
+        ActionKind.SYMLINK: 3,
+        ActionKind.STORE: 3,
+        ActionKind.HARDLINK: 3,
+        ActionKind.SHRINK: 3,
+    }
+
+    @staticmethod
+    def execute(plan: FolderPlan, timer: PhaseTimer | None = None, quarantine: Quarantine | None = None):
+        """
+        Applies every action of `plan`. With a `timer`, the time spent on each
+        kind of action is added to the phase `execute.<kind>`.
+        """
+        # Timings are summed locally and handed to the timer once per plan.
+        timings: dict[ActionKind, _ActionTiming] = {}
+        for action in PlanExecutor.__sorted_actions(plan):
+            start = time.perf_counter()
+            PlanExecutor.__execute_action(plan, action, quarantine)
+            timing = timings.setdefault(action.kind, _ActionTiming())
+            timing.seconds += time.perf_counter() - start
+            timing.calls += 1
+
+        if timer is not None:
+            for kind, timing in timings.items():
+                timer.add(f"execute.{kind.value}", timing.seconds, timing.calls)
+
+    @staticmethod
+    def replay(plan: FolderPlan, quarantine: Quarantine | None = None):
+        """
+        Applies a plan that may already have been partly applied, e.g. by a run
+        that was interrupted. Actions whose result is already on disk are skipped.
+        """
+        for action in PlanExecutor.__sorted_actions(plan):
+            pending = PlanExecutor.__pending_part(action)
+            if pending is not None:
+                PlanExecutor.__execute_action(plan, pending, quarantine)
+
+    @staticmethod
+    def __sorted_actions(plan: FolderPlan) -> list[CleanAction]:
+        return sorted(
+            plan.actions,
+            key=lambda a: (
+                PlanExecutor._ORDER[a.kind],
+                # Deeper directories first, everything else by path.
+                -a.path.count(os.path.sep) if a.kind is ActionKind.RMDIR else 0,
+                a.path
+            )
+        )
+
+    @staticmethod
+    def __pending_part(action: CleanAction) -> CleanAction | None:
+        """What is left to do of an action that may already have been applied."""
+        if action.kind in (ActionKind.UNLINK, ActionKind.RMDIR, ActionKind.RMTREE, ActionKind.DUPLICATE):
+            return action if os.path.lexists(action.path) else None
+        if action.kind is ActionKind.SHRINK:
+            assert action.target is not None
+            return action if os.path.exists(action.target) else None
+        if action.kind is ActionKind.HARDLINK:
+            assert action.target is not None
+            try:
+                return None if os.path.samefile(action.path, action.target) else action
+            except OSError:
+                return None  # One of the copies is gone, there is nothing left to link.
+        if os.path.islink(action.path):
+            return None  # The background is already linked.
+        if action.kind is ActionKind.STORE and not os.path.exists(action.path):
+            assert action.target is not None
+            # Interrupted between the move into the store and the link.
+            if os.path.exists(action.target):
+                return CleanAction(ActionKind.SYMLINK, action.path, target=action.target)
+            return None
+        return action
+
+    @staticmethod
+    def __execute_action(plan: FolderPlan, action: CleanAction, quarantine: Quarantine | None):
+        if action.kind is ActionKind.UNLINK:
+            try:
+                os.unlink(action.path)
+            except Exception as e:
+                raise CleanError(e, plan.folder, os.path.relpath(action.path, plan.folder))
+        elif action.kind is ActionKind.RMDIR:
+            try:
+                os.rmdir(action.path)
+            except OSError as e:
+                # This can happen if a file is deleted but the handle is not yet released.
+                # It's generally safe to ignore.
+                print(f"Could not remove empty directory {action.path}: {e}")
+        elif action.kind in (ActionKind.RMTREE, ActionKind.DUPLICATE):
+            if quarantine is None or not PlanExecutor.__quarantine_folder(plan.folder, quarantine):
+                PlanExecutor.__remove_folder(plan.folder, plan.inventory)
+        elif action.kind is ActionKind.SYMLINK:
+            PlanExecutor.__replace_with_symlink(plan.folder, action)
+        elif action.kind is ActionKind.STORE:
+            PlanExecutor.__move_to_store(plan.folder, action)
+        elif action.kind is ActionKind.HARDLINK:
+            PlanExecutor.__replace_with_hardlink(plan.folder, action)
+        elif action.kind is ActionKind.SHRINK:
+            assert action.target is not None
+            try:
+                os.replace(action.target, action.path)
+            except Exception as e:
+                raise CleanError(e, plan.folder, os.path.relpath(action.path, plan.folder))
+
+    @staticmethod
+    def __quarantine_folder(folder: Path, quarantine: Quarantine) -> bool:
+        """Moves a whole beatmap folder into quarantine. Returns whether it could be moved."""
+        try:
+            quarantine.move(folder)
+            return True
+        except OSError as e:
+            # E.g. a file of the folder is open in another program; deleting may still work.
+            print(f"Could not move {folder} to quarantine, deleting it instead: {e}")
+            return False
+
+    @staticmethod
+    def __remove_folder(folder: Path, inventory: FolderInventory | None):
+        """
+        Deletes a whole beatmap folder. When the folder's inventory is known,
+        its files and directories are removed directly; `shutil.rmtree` is only
+        used as a fallback if something appeared in the folder after it was scanned.
+        """
+        if inventory is None:
+            shutil.rmtree(folder)
+            return
+        try:
+            for file in inventory.files:
+                os.unlink(file.path)
+            for directory in inventory.dirs_bottom_up():
+                os.rmdir(directory.path)
+            os.rmdir(folder)
+        except OSError:
+            shutil.rmtree(folder)
+
+    @staticmethod
+    def __replace_with_symlink(folder: Path, action: CleanAction):
+        assert action.target is not None
+        try:
+            img_file_path = Path(action.path)
+            # Ensure the destination directory exists before creating the symlink.
+            # This is crucial if the original file was in a subfolder that got deleted.
+            img_file_path.parent.mkdir(parents=True, exist_ok=True)
+
+            # Delete the original file (if it exists) and create a symlink.
+            if action.replaces is not None:
+                Path(action.replaces).unlink(missing_ok=True)
+            img_file_path.unlink(missing_ok=True)
+            os.symlink(action.target, img_file_path)
+        except Exception as e:
+            raise CleanError(e, folder, os.path.relpath(action.path, folder))
+
+    @staticmethod
+    def __move_to_store(folder: Path, action: CleanAction):
+        assert action.target is not None
+        try:
+            os.makedirs(os.path.dirname(action.target), exist_ok=True)
+            # Both paths are inside Songs, so this is a rename, not a copy.
+            os.replace(action.path, action.target)
+            try:
+                os.symlink(action.target, action.path)
+            except OSError:
+                # Put the image back rather than leave the beatmap without it.
+                os.replace(action.target, action.path)
+                raise
+        except Exception as e:
+            raise CleanError(e, folder, os.path.relpath(action.path, folder))
+
+    @staticmethod
+    def __replace_with_hardlink(folder: Path, action: CleanAction):
+        assert action.target is not None
+        # The link is made under a temporary name and renamed over the file, so
+        # the beatmap is never left without it, even if the app is closed midway.
+        temp_path = action.path + ".shx-link"
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        try:
+            os.link(action.target, temp_path)
+            os.replace(temp_path, action.path)
+        except Exception as e:
+            raise CleanError(e, folder, os.path.relpath(action.path, folder))
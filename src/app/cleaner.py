@@ -2,62 +2,179 @@ import json
 import os
 import re
 import shutil
+import time
+from collections import deque
+from collections.abc import Sized
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
-from typing import Callable, Literal
+from threading import Thread
+from typing import Callable, Iterable, Iterator, Literal
 
 from ..exceptions import CleanError, OSUParsingError
-from .osu_parser import OSUFilesFolder, OSUParser
+from .clean_plan import (ActionKind, CleanAction, FolderPlan, PlanExecutor,
+                         PlanTotals, SpaceCategory)
+from .dedupe import BackgroundStore, MediaStore
+from .deletion_stage import DeletionStage
+from .file_utils import atomic_write_text, format_size
+from .folder_inventory import FolderInventory, InventoryFile
+from .instrumentation import PhaseTimer, RunProfiler
+from .mapset_index import MapsetIndex
+from .metadata_cache import MetadataCache
+from .osu_db import OSUDbIndex
+from .osu_parser import OSUFile, OSUFilesFolder, OSUParser
+from .processed_index import ProcessedIndex, folder_signature
+from .progress import ProgressReporter, ProgressSnapshot
+from .quarantine import Quarantine
+from .run_journal import RunJournal
+from .shrink import DEFAULT_MAX_SIZE, DEFAULT_QUALITY, BackgroundShrinker
 from .types import CleanerParams, OSUGameModes
 
 
+# Folders inside Songs that belong to the cleaner itself and must never be cleaned.
+BACKGROUNDS_FOLDER_NAME = "_BACKGROUND-DO-NOT-DELETE"
+RESERVED_FOLDER_NAMES = frozenset({BACKGROUNDS_FOLDER_NAME})
+# The content-addressed store for deduplicated backgrounds, inside BACKGROUNDS_FOLDER_NAME.
+BACKGROUND_STORE_NAME = "store"
+
+# File types, to tell which kind of junk a deleted file is (see `SpaceCategory`).
+AUDIO_EXTENSIONS = frozenset({".wav", ".ogg", ".mp3"})
+VIDEO_EXTENSIONS = frozenset({".mp4", ".avi", ".flv", ".wmv", ".m4v", ".mkv", ".mov", ".mpg", ".mpeg", ".webm"})
+IMAGE_EXTENSIONS = frozenset({".png", ".jpg", ".jpeg", ".bmp", ".gif"})
+# Beatmap skin elements, by the start of their names. Anything else is treated as a storyboard sprite.
+SKIN_ELEMENT_PATTERN = re.compile(
+    r"^(hitcircle|approachcircle|sliderstartcircle|sliderendcircle|sliderb|sliderfollowcircle|"
+    r"sliderscorepoint|reversearrow|followpoint|spinner-|cursor|hit0|hit50|hit100|hit300|hit-?geki|hit-?katu|"
+    r"default-|score-|combo-|comboburst|lighting|particle|star2?\.|ready|count[123]|go\.|"
+    r"fail-background|section-|play-|pause-|scorebar-|inputoverlay-|taiko-|mania-|fruit-|"
+    r"menu-|selection-|ranking-|welcome_text)"
+)
+
+
 class _FolderCleaner:
     """
-    A worker class responsible for cleaning a single beatmap folder.
+    A worker class responsible for planning the cleanup of a single beatmap folder.
     It is instantiated for each folder that needs to be processed.
+
+    It only decides what has to change and never touches the disk itself; the
+    resulting `FolderPlan` is applied by `PlanExecutor` (or just reported, in
+    a dry run).
     """
     folder_path: Path
     params: CleanerParams
+    cache: MetadataCache | None
+    db: OSUDbIndex | None
+    timer: PhaseTimer
+    inventory: FolderInventory
     of_folder: OSUFilesFolder
+    _video_keys: set[str]
+    _image_keys: set[str]
 
-    def __init__(self, folder_path: Path, params: CleanerParams):
+    def __init__(
+        self,
+        folder_path: Path,
+        params: CleanerParams,
+        cache: MetadataCache | None = None,
+        timer: PhaseTimer | None = None,
+        db: OSUDbIndex | None = None
+    ):
         self.folder_path = folder_path
         self.params = params
+        self.cache = cache
+        self.db = db
+        self.timer = timer or PhaseTimer()
 
-    def clean(self):
+    def plan(self) -> FolderPlan:
         """
-        Executes the full cleaning process for the folder.
-        1. Parses the folder to identify all relevant files.
-        2. Deletes all junk files based on user settings.
-        3. Replaces background images if requested.
-        4. Deletes the folder if it becomes empty.
+        Works out the full cleaning process for the folder.
+        1. Scans the folder tree once; every later step works from that snapshot.
+        2. Parses the folder to identify all relevant files.
+        3. Plans the deletion of all junk files based on user settings.
+        4. Plans the replacement of background images if requested.
+        5. Plans the deletion of the folder if it would become empty.
         """
-        self.of_folder = OSUParser.parse_folder(
-            self.folder_path, self.params['delete_modes']
-        )
+        with self.timer.phase("scan"):
+            self.inventory = FolderInventory(self.folder_path)
+        with self.timer.phase("parse"):
+            self.of_folder = OSUParser.parse_folder(
+                self.folder_path, self.params['delete_modes'], self.inventory, self.cache, self.db
+            )
 
         # If parsing found no difficulties to keep, the entire folder is junk.
         if not self.of_folder.osu_files:
-            shutil.rmtree(self.folder_path)
-            return
-
-        self.__delete_trash()
-        self.__cleanup_empty_dirs()
-
-        # If, after cleaning, no .osu files remain, the folder is now empty.
-        if not list(self.folder_path.glob("*.osu")):
-            shutil.rmtree(self.folder_path)
-            return
+            return FolderPlan.remove(self.folder_path, self.inventory, ActionKind.RMTREE)
+
+        with self.timer.phase("plan"):
+            return self.__plan_actions()
+
+    def __plan_actions(self) -> FolderPlan:
+        """Plans the individual deletions and replacements (steps 3-5 of `plan`)."""
+        replacements = self.__plan_image_replacements()
+        actions = self.__plan_trash(replacements)
+        actions.extend(self.__plan_empty_dirs())
+
+        # If, after cleaning, no .osu files would remain, the folder is junk as well.
+        # Deleting it in one go makes the individual deletions unnecessary.
+        if not self.inventory.has_osu_files():
+            return FolderPlan.remove(self.folder_path, self.inventory, ActionKind.RMTREE)
+
+        actions.extend(replacements.values())
+        return FolderPlan(
+            self.folder_path, actions, True, self.inventory,
+            self.__kept_images(), self.__kept_difficulties(), self.__kept_media()
+        )
 
-        self.__replace_images()
+    def __kept_difficulties(self) -> list[tuple[InventoryFile, OSUFile]]:
+        """The kept .osu files with their parsed contents, to find duplicate mapsets."""
+        if not self.params.get('dedupe_mapsets', False):
+            return []
+        parsed = {osu_file.filename: osu_file for osu_file in self.of_folder.osu_files}
+        return [
+            (f, parsed[f.rel_path.lower()]) for f in self.inventory.osu_files
+            if f.rel_path.lower() in parsed
+        ]
 
-    def __delete_trash(self):
+    def __kept_images(self) -> list[InventoryFile]:
+        """
+        The referenced background images that stay in the folder as real files,
+        for "Keep + Dedupe" and "Shrink". Images that are already links are left alone.
+        """
+        if not self.params.get('dedupe_backgrounds', False) and not self.params.get('shrink_backgrounds', False):
+            return []
+        if self.params['delete_images'] or self.params.get('user_images'):
+            return []
+        image_keys = {p.replace(os.path.sep, '/') for p in self.of_folder.image_filenames}
+        return [
+            f for f in self.inventory.files
+            if f.rel_path.lower() in image_keys
+            and not f.is_symlink and f.size > 0
+            and not self.inventory.is_removed(f.rel_path)
+        ]
+
+    def __kept_media(self) -> list[InventoryFile]:
+        """The kept audio files, and videos with "Keep videos", for "Dedupe audio/video"."""
+        if not self.params.get('dedupe_media', False):
+            return []
+        media_keys = {p.replace(os.path.sep, '/') for p in self.of_folder.audio_filenames}
+        if self.params.get('keep_videos', False):
+            media_keys |= self._video_keys
+        return [
+            f for f in self.inventory.files
+            if f.rel_path.lower() in media_keys
+            and not f.is_symlink and f.size > 0
+            and not self.inventory.is_removed(f.rel_path)
+        ]
+
+    def __plan_trash(self, replacements: dict[str, CleanAction]) -> list[CleanAction]:
         """
-        Deletes all non-essential files by recursively walking the folder.
+        Plans the deletion of all non-essential files found in the folder's inventory.
 
         This method works by first building a set of all files that are required
-        (osu files, audio, referenced images/videos). It then walks the entire
-        directory tree and removes any file whose relative path is not in this
-        "keep set".
+        (osu files, audio, referenced images/videos). It then goes through every
+        file in the directory tree and marks any file whose relative path is
+        not in this "keep set" for deletion. Images that are going to be replaced
+        by a symlink are left to the replacement instead.
         """
         # 1. Build the set of files to keep.
         # The paths are normalized to use forward slashes, matching osu!'s format.
@@ -68,95 +185,124 @@ class _FolderCleaner:
             p.replace(os.path.sep, '/') for p in self.of_folder.audio_filenames
         )
 
+        # Referenced videos and backgrounds, also used to tell what a deleted file was.
+        self._video_keys = {p.replace(os.path.sep, '/') for p in self.of_folder.video_filenames}
+        self._image_keys = {p.replace(os.path.sep, '/') for p in self.of_folder.image_filenames}
+
         if self.params.get('keep_videos', False):
-            files_to_keep.update(
-                p.replace(os.path.sep, '/') for p in self.of_folder.video_filenames
-            )
+            files_to_keep.update(self._video_keys)
 
         # Images are only kept if no delete/replace option is active.
         if not self.params['delete_images'] and not self.params.get('user_images'):
-            files_to_keep.update(
-                p.replace(os.path.sep, '/') for p in self.of_folder.image_filenames
-            )
-
-        # 2. Walk the directory and delete files not in the keep set.
-        for root, _, files in os.walk(self.folder_path):
-            for file in files:
-                try:
-                    full_path = Path(root, file)
-                    relative_path = full_path.relative_to(self.folder_path)
-                    
-                    # Normalize path to use forward slashes for comparison.
-                    normalized_relative_path = str(relative_path).replace(os.path.sep, '/')
-
-                    if normalized_relative_path.lower() not in files_to_keep:
-                        full_path.unlink()
-
-                except Exception as e:
-                    raise CleanError(e, self.folder_path, file)
+            files_to_keep.update(self._image_keys)
 
-    def __cleanup_empty_dirs(self):
-        """
-        Removes any empty subdirectories that may have been left behind after
-        deleting junk files. It walks the tree from the bottom up.
-        """
-        for root, _, _ in os.walk(self.folder_path, topdown=False):
-            # Don't attempt to delete the root folder itself in this loop.
-            if Path(root) == self.folder_path:
+        # 2. Plan to delete files not in the keep set. Inventory paths already use forward slashes.
+        actions: list[CleanAction] = []
+        for file in self.inventory.files:
+            key = file.rel_path.lower()
+            if key in files_to_keep:
                 continue
-            try:
-                if not os.listdir(root):
-                    os.rmdir(root)
-            except OSError as e:
-                # This can happen if a file is deleted but the handle is not yet released.
-                # It's generally safe to ignore.
-                print(f"Could not remove empty directory {root}: {e}")
+            replacement = replacements.get(key)
+            if replacement is not None and replacement.replaces is None:
+                replacement.replaces = file.path
+                replacement.size = file.size
                 continue
+            actions.append(CleanAction(ActionKind.UNLINK, file.path, file.size, category=self.__category_of(key)))
+            self.inventory.discard(file.rel_path)
+        return actions
 
-    def __replace_images(self):
+    def __category_of(self, key: str) -> SpaceCategory:
+        """
+        Which kind of junk a deleted file is, for the reclaimed space report.
+        Referenced backgrounds and videos are known from the parsed .osu files,
+        everything else is judged by its name.
         """
-        Replaces background images with user-provided ones.
+        if key in self._image_keys:
+            return SpaceCategory.BACKGROUNDS
+        if key in self._video_keys:
+            return SpaceCategory.VIDEOS
+        name = key.rpartition("/")[2]
+        extension = os.path.splitext(name)[1]
+        if extension == ".osu":
+            return SpaceCategory.REMOVED_MODES
+        if extension == ".osb":
+            return SpaceCategory.STORYBOARDS
+        if extension in VIDEO_EXTENSIONS:
+            return SpaceCategory.VIDEOS
+        if extension in AUDIO_EXTENSIONS:
+            return SpaceCategory.HITSOUNDS
+        if extension in IMAGE_EXTENSIONS:
+            # Skins only use the top of the folder; storyboards often use subfolders.
+            if "/" not in key and SKIN_ELEMENT_PATTERN.match(name):
+                return SpaceCategory.SKIN
+            return SpaceCategory.STORYBOARDS
+        if key == "skin.ini":
+            return SpaceCategory.SKIN
+        return SpaceCategory.OTHER
+
+    def __plan_empty_dirs(self) -> list[CleanAction]:
+        """
+        Plans the removal of subdirectories that the planned deletions leave
+        empty. It goes through the inventory from the bottom up, so no directory
+        has to be listed again.
+        """
+        actions: list[CleanAction] = []
+        for directory in self.inventory.dirs_bottom_up():
+            if self.inventory.is_empty(directory.rel_path):
+                actions.append(CleanAction(ActionKind.RMDIR, directory.path))
+                self.inventory.discard(directory.rel_path)
+        return actions
+
+    def __plan_image_replacements(self) -> dict[str, CleanAction]:
+        """
+        Plans the replacement of background images with user-provided ones.
 
         This method is robust: it iterates through each difficulty file (.osu) and
         replaces the specific background referenced within it. This ensures that
         even if the image file is missing, a new one (as a symlink) is created
         with the correct name, and it correctly handles mapsets that use different
         backgrounds for different difficulties.
+
+        The result is keyed by the image's lowercase relative path, so that
+        different difficulties sharing the same background produce one symlink.
         """
         user_imgs = self.params.get('user_images')
         if not user_imgs:
-            return
-
-        # This set prevents trying to create the same symlink multiple times
-        # if different difficulties share the same background file.
-        replaced_bgs_in_folder = set()
+            return {}
 
+        replacements: dict[str, CleanAction] = {}
         for osu_file in self.of_folder.osu_files:
             for bg_filename in osu_file.image_filenames:
-                if bg_filename in replaced_bgs_in_folder:
+                key = bg_filename.replace(os.path.sep, '/')
+                if key in replacements:
                     continue
 
-                try:
-                    img_file_path = self.folder_path.joinpath(bg_filename)
-                    img_suffix = img_file_path.suffix.lower()
-
-                    if img_suffix not in user_imgs:
-                        continue
+                img_file_path = self.folder_path.joinpath(bg_filename)
+                img_suffix = img_file_path.suffix.lower()
+                if img_suffix not in user_imgs:
+                    continue
 
-                    source_image_path = user_imgs[img_suffix]
+                replacements[key] = CleanAction(
+                    ActionKind.SYMLINK, str(img_file_path), target=str(user_imgs[img_suffix])
+                )
+        return replacements
 
-                    # Ensure the destination directory exists before creating the symlink.
-                    # This is crucial if the original file was in a subfolder that got deleted.
-                    img_file_path.parent.mkdir(parents=True, exist_ok=True)
 
-                    # Delete the original file (if it exists) and create a symlink.
-                    img_file_path.unlink(missing_ok=True)
-                    os.symlink(source_image_path, img_file_path)
-                    
-                    replaced_bgs_in_folder.add(bg_filename)
+@dataclass
+class _FolderResult:
+    """What a planning worker hands back for a single folder."""
 
-                except Exception as e:
-                    raise CleanError(e, self.folder_path, bg_filename)
+    plan: FolderPlan
+    seconds: float
+    """The time spent planning the folder."""
+    deletion: "Future[float] | None"
+    """The plan's execution in the deletion stage, or `None` in a dry run."""
+    journal_entry: int | None = None
+    """The plan's entry in the run journal, if it was logged."""
+    unchanged: bool = False
+    """Whether the folder was processed by an earlier run and hasn't changed since, so nothing was planned."""
+    signature: str | None = None
+    """The signature of an unchanged folder, computed while checking it."""
 
 
 class Cleaner:
@@ -169,20 +315,77 @@ class Cleaner:
         self,
         songs_folder: Path,
         params: CleanerParams,
-        progress_step: Callable[[int], None]
+        on_progress: Callable[[ProgressSnapshot], None],
+        quarantine_area: Quarantine | None = None
     ):
         self.songs_folder = songs_folder
         self.params = params
-        self.progress_step = progress_step
+        # Coalesces per-folder progress into snapshots, at most 10 per second.
+        self.progress = ProgressReporter(on_progress)
+        # In a dry run the plan is only written to `clean_plan.jsonl`, nothing is deleted.
+        self.dry_run = self.params.get('dry_run', False)
+        self.plan_totals = PlanTotals()
+        self.plan_path = self.songs_folder / "clean_plan.jsonl"
+        # Per-phase timings of every run, written to `clean_report.json` when it ends.
+        self.timer = PhaseTimer()
+        self.report_path = self.songs_folder / "clean_report.json"
+        # The opt-in cProfile/tracemalloc capture, added to the report.
+        self.profiler = RunProfiler() if self.params.get('profile', False) else None
 
         self._prepare_custom_backgrounds()
 
-        # Load the list of IDs from previous runs, unless "Force Clean" is enabled.
-        self.proc_folders_json_path = self.songs_folder / "processed_folders.json"
-        if self.params.get('force_clean', False):
-            self.processed_folders = []
-        else:
-            self.processed_folders = self.__load_proc_folders()
+        # Whole folders removed by earlier runs with "Quarantine" on, purged when this run starts.
+        # With the option on, this run moves its own removals there instead of deleting them.
+        # A quarantine passed in is shared by several runs (e.g. the batches of a watch session)
+        # and purged by its owner, so that they don't purge each other's folders.
+        self._owns_quarantine = quarantine_area is None
+        self._quarantine_area = quarantine_area or Quarantine(self.songs_folder)
+        self.quarantine: Quarantine | None = None
+        if self.params.get('quarantine', False) and not self.dry_run:
+            if self._quarantine_area.is_on_same_volume():
+                self.quarantine = self._quarantine_area
+            else:
+                print(
+                    f"{self._quarantine_area.root} is not on the same volume as the Songs folder, "
+                    "folders will be deleted instead of quarantined"
+                )
+
+        # Load the IDs from previous runs. "Force Clean" starts from an empty index.
+        self.processed_folders = ProcessedIndex(
+            self.songs_folder, reset=self.params.get('force_clean', False)
+        )
+        # osu!'s own index, next to osu!.exe, to skip parsing difficulties of deleted modes.
+        self.osu_db: OSUDbIndex | None = None
+        self.osu_db_path = self.songs_folder.parent / "osu!.db"
+
+        # The write-ahead log of executed plans, to resume an interrupted run. Not used in a dry run.
+        self.journal = RunJournal(self.songs_folder)
+        # Parsed .osu files from previous runs, so unchanged difficulties aren't parsed again.
+        self.metadata_cache = MetadataCache(self.songs_folder)
+        # Folders holding the same mapset as another folder, whatever their names.
+        self.mapset_index = MapsetIndex() if self.params.get('dedupe_mapsets', False) else None
+        # "Keep + Dedupe": identical kept backgrounds are stored once and linked.
+        self.background_store: BackgroundStore | None = None
+        if (
+            self.params.get('dedupe_backgrounds', False)
+            and not self.params['delete_images'] and not self.params.get('user_images')
+        ):
+            self.background_store = BackgroundStore(
+                self.songs_folder / BACKGROUNDS_FOLDER_NAME / BACKGROUND_STORE_NAME
+            )
+        # "Shrink": kept backgrounds are downscaled and re-encoded in place.
+        self.shrinker: BackgroundShrinker | None = None
+        if (
+            self.params.get('shrink_backgrounds', False) and self.background_store is None
+            and not self.params['delete_images'] and not self.params.get('user_images')
+        ):
+            self.shrinker = BackgroundShrinker(
+                self.songs_folder,
+                self.params.get('shrink_max_size', DEFAULT_MAX_SIZE),
+                self.params.get('shrink_quality', DEFAULT_QUALITY)
+            )
+        # "Dedupe audio/video": identical kept songs and videos are hard-linked to one copy.
+        self.media_store = MediaStore(self.songs_folder) if self.params.get('dedupe_media', False) else None
 
     def _prepare_custom_backgrounds(self):
         """
@@ -194,31 +397,20 @@ class Cleaner:
         if not user_imgs:
             return
 
-        backgrounds_storage_path = self.songs_folder / "_BACKGROUND-DO-NOT-DELETE"
-        backgrounds_storage_path.mkdir(exist_ok=True)
+        backgrounds_storage_path = self.songs_folder / BACKGROUNDS_FOLDER_NAME
+        if not self.dry_run:
+            backgrounds_storage_path.mkdir(exist_ok=True)
 
         new_user_images = {}
         for img_type, img_path in user_imgs.items():
             source_path = Path(img_path)
             dest_path = backgrounds_storage_path / source_path.name
-            if not dest_path.exists():
+            if not self.dry_run and not dest_path.exists():
                 shutil.copy(source_path, dest_path)
             new_user_images[img_type] = dest_path.resolve()
 
         self.params["user_images"] = new_user_images
 
-    def __load_proc_folders(self) -> list[int]:
-        """Loads a list of already processed beatmap IDs from `processed_folders.json`."""
-        if not self.proc_folders_json_path.exists():
-            return []
-        with open(self.proc_folders_json_path, 'r', encoding='utf-8') as json_file:
-            return json.load(json_file)
-
-    def __dump_proc_folders(self):
-        """Saves the list of processed beatmap IDs to `processed_folders.json`."""
-        with open(self.proc_folders_json_path, 'w', encoding='utf-8') as json_file:
-            json.dump(self.processed_folders, json_file, indent=4)
-
     def _get_folder_id(self, folder: Path) -> int | None | Literal[-1]:
         """
         Determines the status of a folder's beatmap ID from its name.
@@ -247,60 +439,556 @@ class Cleaner:
         # The name starts with a digit but doesn't match the required format.
         return -1
 
-    def start_clean(self, folders: list[Path]):
+    def iter_song_folders(self) -> Iterator[Path]:
+        """
+        Streams the beatmap folders of the Songs directory as they are read.
+        `os.scandir` knows from the directory entry itself whether it is a
+        folder, so no extra stat call is made per entry.
+        """
+        with os.scandir(self.songs_folder) as it:
+            for entry in it:
+                if entry.is_dir():
+                    yield Path(entry.path)
+
+    def __count_song_folders(self):
+        """Counts the beatmap folders in a separate pass and reports the result."""
+        with os.scandir(self.songs_folder) as it:
+            total = sum(1 for entry in it if entry.is_dir())
+        self.progress.set_total(total)
+
+    def start_clean(self, folders: Iterable[Path] | None = None):
         """
         Starts the main cleaning loop for all folders found in the Songs directory.
+
+        Without `folders`, the Songs directory is discovered on the fly: cleaning
+        starts with the first folder that is read, and the total number of
+        folders is counted on a separate thread and included in later progress
+        snapshots, which enables the ETA.
+
+        Routing decisions (skip, duplicate, clean) are made here, one folder at
+        a time and in order, while the actual cleaning runs in a two-stage
+        pipeline: a pool of `workers` threads scans, parses and plans folders
+        and hands each plan over to a `DeletionStage`, which executes it on its
+        own threads. Results are collected strictly in submission order, once
+        a folder's plan has been executed, and a folder whose ID is still being
+        cleaned waits for that result before it is routed, so the outcome is
+        identical to a sequential run.
+
+        A folder whose ID was processed by an earlier run is only skipped while
+        its `folder_signature` matches the one recorded after it was cleaned;
+        one that changed since then, e.g. a mapset updated in place, is cleaned
+        again.
+
+        Every executed plan is logged in a `RunJournal` first, so if the run is
+        interrupted, the next one finishes the folders it was working on and
+        skips the ones it had finished.
+
+        Whether the run succeeds or fails, a report with per-phase timings is
+        written to `clean_report.json` at the end, see `__write_report`.
         """
+        started_at = time.time()
+        if self.profiler is not None:
+            self.profiler.start()
+        error: BaseException | None = None
+        try:
+            self.__clean_all(folders)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.__write_report(started_at, error)
+
+    def __clean_all(self, folders: Iterable[Path] | None):
         # This set tracks IDs that are processed *in this specific run*.
         # It's essential for handling duplicates found in the same batch,
         # distinguishing them from duplicates from a *previous* run.
-        processed_in_this_run = set()
+        self._processed_in_this_run: set[int] = set()
+        # Folders submitted to the pool whose results haven't been collected yet.
+        self._pending: deque[tuple[Path, int | None, bool, Future[_FolderResult]]] = deque()
+        self._in_flight_ids: set[int] = set()
+        self._collected = 0
+        self._kept_inventories: dict[Path, FolderInventory] = {}
+
+        self._plan_file = open(self.plan_path, 'w', encoding='utf-8') if self.dry_run else None
+        if not self.dry_run:
+            if self._owns_quarantine:
+                self._quarantine_area.purge_in_background()
+            with self.timer.phase("resume"):
+                self.__resume_interrupted_run()
+                # After the resume, which may still need some of them to finish its plans.
+                BackgroundShrinker.remove_pending_outputs(self.songs_folder)
+
+        workers = max(1, self.params.get('workers', 1))
+        # Bounds how far routing may run ahead of the workers.
+        max_pending = workers * 4
+
+        if folders is None:
+            folders = self.iter_song_folders()
+            Thread(target=self.__count_song_folders, name="folder-count", daemon=True).start()
+        elif isinstance(folders, Sized):
+            self.progress.set_total(len(folders))
+
+        if self.params.get('use_osu_db', True) and self.params['delete_modes']:
+            with self.timer.phase("osu_db"):
+                self.__load_osu_db()
+
+        self.progress.set_phase("cleaning")
+        initializer = self.profiler.thread_initializer if self.profiler is not None else None
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cleaner", initializer=initializer)
+        # The planning workers block once this many plans are waiting to be executed.
+        self._deletions = DeletionStage(workers, max_pending, self.timer, initializer, self.quarantine)
+        try:
+            for folder in folders:
+                try:
+                    self.__route_folder(pool, folder)
+                except (CleanError, OSUParsingError) as e:
+                    raise e
+                except Exception as e:
+                    raise CleanError(e, folder)
+
+                while len(self._pending) > max_pending:
+                    self.__collect_next()
+
+            while self._pending:
+                self.__collect_next()
+
+            if self.mapset_index is not None:
+                self.progress.set_phase("finding duplicate mapsets")
+                with self.timer.phase("duplicate_mapsets"):
+                    self.__remove_duplicate_mapsets(pool)
+
+            if self.background_store is not None:
+                self.progress.set_phase("deduplicating")
+                with self.timer.phase("dedupe_backgrounds"):
+                    self.__dedupe_backgrounds(pool)
+
+            if self.shrinker is not None:
+                self.progress.set_phase("shrinking")
+                with self.timer.phase("shrink_backgrounds"):
+                    self.__shrink_backgrounds(pool)
+
+            if self.media_store is not None:
+                self.progress.set_phase("deduplicating")
+                with self.timer.phase("dedupe_media"):
+                    self.__dedupe_media(pool)
+        finally:
+            # The planning pool goes first: its workers may still be waiting for a deletion slot.
+            pool.shutdown(wait=True, cancel_futures=True)
+            self._deletions.shutdown(cancel_futures=True)
+            if self._plan_file is not None:
+                self._plan_file.close()
+
+        self.progress.set_phase("saving")
+        if self.dry_run:
+            self.__finish_dry_run()
+            self.progress.finish()
+            return
 
-        for index, folder in enumerate(folders):
-            try:
-                folder_id = self._get_folder_id(folder)
-                self.progress_step(folder_id if folder_id is not None else -1)
+        # Final save of all processed IDs and parsed metadata at the end of the run.
+        with self.timer.phase("save"):
+            self.processed_folders.close()
+            self.journal.close()
+            self.metadata_cache.save()
+            if self.media_store is not None:
+                self.media_store.save()
+            if self.shrinker is not None:
+                self.shrinker.save()
+        cache = self.metadata_cache
+        if cache.hits + cache.misses:
+            print(
+                f"Metadata cache: {cache.hits} hits, {cache.misses} misses "
+                f"({cache.hit_rate:.1%} hit rate)"
+            )
+        self.progress.finish()
+
+    def __route_folder(self, pool: ThreadPoolExecutor, folder: Path):
+        """Decides what to do with a single folder and submits the work to the pool."""
+        folder_id = self._get_folder_id(folder)
+        self.metadata_cache.touch(folder.name)
+        if self.media_store is not None:
+            self.media_store.touch(folder.name)
+
+        # Case 1: Invalid ID format (e.g., too long) or one of our own folders. Always skip.
+        if folder_id == -1 or folder.name in RESERVED_FOLDER_NAMES:
+            self.progress.step(-1)
+            return
 
-                # Case 1: Invalid ID format (e.g., too long). Always skip.
-                if folder_id == -1:
-                    continue
+        # Case 2: No numeric ID prefix. Clean only if "dangerous" mode is on.
+        if folder_id is None:
+            if self.params.get('dangerous_clean_no_id', False):
+                self.__submit(pool, folder, None, False, partial(self.__clean_folder, folder))
+            else:
+                self.progress.step(-1)
+            return
 
-                # Case 2: No numeric ID prefix. Clean only if "dangerous" mode is on.
-                if folder_id is None:
-                    if self.params.get('dangerous_clean_no_id', False):
-                        _FolderCleaner(folder, self.params).clean()
-                    continue # Otherwise, skip.
+        # Case 3: Valid ID. Now we handle duplicate and processed logic.
 
-                # Case 3: Valid ID. Now we handle duplicate and processed logic.
+        # Whether this is a duplicate depends on how the previous folder with the
+        # same ID ended up, so wait until its result has been collected.
+        while folder_id in self._in_flight_ids:
+            self.__collect_next()
 
-                # If we've already handled this ID in this session, this is a duplicate. Delete it.
-                if folder_id in processed_in_this_run:
-                    shutil.rmtree(folder)
-                    continue
+        # If we've already handled this ID in this session, this is a duplicate. Delete it.
+        if folder_id in self._processed_in_this_run:
+            self.__submit(pool, folder, folder_id, False, partial(self.__remove_duplicate, folder))
+            return
 
-                # If this ID was handled in a *previous* session (and we're not forcing a re-clean),
-                # we should skip it. We also add it to the current session's set to ensure
-                # any subsequent duplicates in *this* batch are correctly deleted.
-                if folder_id in self.processed_folders:
-                    processed_in_this_run.add(folder_id)
-                    continue
+        # If this ID was handled in a *previous* session (and we're not forcing a re-clean),
+        # it is skipped, unless its folder changed since then. Comparing signatures
+        # takes a scan, so it runs on the pool like cleaning would.
+        if folder_id in self.processed_folders:
+            self._in_flight_ids.add(folder_id)
+            self.__submit(pool, folder, folder_id, True, partial(self.__clean_if_changed, folder, folder_id))
+            return
+
+        # If we've reached here, it's a new, valid map. Clean it.
+        self._in_flight_ids.add(folder_id)
+        self.__submit(pool, folder, folder_id, True, partial(self.__clean_folder, folder))
+
+    def __clean_if_changed(self, folder: Path, folder_id: int) -> _FolderResult:
+        """
+        Cleans a folder processed by an earlier run again if its signature
+        changed, e.g. because the mapset was updated. IDs recorded by older
+        versions have no signature yet: they are skipped and get one.
+        """
+        start = time.perf_counter()
+        with self.timer.phase("signature"):
+            signature = folder_signature(folder)
+        recorded = self.processed_folders.signature(folder_id)
+        if recorded is None or signature == recorded:
+            plan = FolderPlan(folder, [], True)
+            return _FolderResult(plan, time.perf_counter() - start, None, unchanged=True, signature=signature)
+        return self.__clean_folder(folder)
+
+    def __clean_folder(self, folder: Path) -> _FolderResult:
+        start = time.perf_counter()
+        plan = _FolderCleaner(folder, self.params, self.metadata_cache, self.timer, self.osu_db).plan()
+        return self.__hand_off(plan, start)
+
+    def __remove_duplicate(self, folder: Path) -> _FolderResult:
+        start = time.perf_counter()
+        with self.timer.phase("scan"):
+            inventory = FolderInventory(folder)
+        plan = FolderPlan.remove(folder, inventory, ActionKind.DUPLICATE)
+        return self.__hand_off(plan, start)
+
+    def __hand_off(self, plan: FolderPlan, start: float) -> _FolderResult:
+        """Passes a finished plan on to the deletion stage, unless this is a dry run."""
+        seconds = time.perf_counter() - start
+        if self.dry_run:
+            return _FolderResult(plan, seconds, None)
+        # Logged before anything is deleted, so an interrupted run can finish the plan.
+        entry = self.journal.begin(plan)
+        return _FolderResult(plan, seconds, self._deletions.submit(plan), entry)
+
+    def __apply(self, plan: FolderPlan):
+        """
+        Executes a plan right away, unless this is a dry run. Used by the passes
+        over the whole library, which run after the pipeline has drained.
+        """
+        if self.dry_run:
+            return
+        entry = self.journal.begin(plan)
+        PlanExecutor.execute(plan, self.timer, self.quarantine)
+        self.journal.done(entry)
+        if not plan.keeps_folder:
+            self.metadata_cache.evict(plan.folder.name)
+
+    def __submit(
+        self,
+        pool: ThreadPoolExecutor,
+        folder: Path,
+        folder_id: int | None,
+        record: bool,
+        task: Callable[[], _FolderResult]
+    ):
+        """Queues `task` on the pool. `record` marks folders whose ID should be saved as processed."""
+        self._pending.append((folder, folder_id, record, pool.submit(task)))
+
+    def __collect_next(self):
+        """Waits until the oldest pending folder is planned and executed, then records its result."""
+        folder, folder_id, record, future = self._pending.popleft()
+        try:
+            # The time the main thread spends waiting for the workers.
+            with self.timer.phase("wait"):
+                result = future.result()
+            plan = result.plan
+            seconds = result.seconds
+            if result.deletion is not None:
+                with self.timer.phase("wait_deletion"):
+                    seconds += result.deletion.result()
+        except (CleanError, OSUParsingError) as e:
+            raise e
+        except Exception as e:
+            raise CleanError(e, folder)
+
+        if result.unchanged:
+            # Only folders with an ID recorded by an earlier run are checked for changes.
+            assert folder_id is not None
+            self.__skip_unchanged(folder_id, result.signature)
+            return
 
-                # If we've reached here, it's a new, valid map. Clean it.
-                _FolderCleaner(folder, self.params).clean()
-                
-                # After cleaning, record the ID as processed for this run and for future runs.
-                if folder.exists():
-                    self.processed_folders.append(folder_id)
-                    processed_in_this_run.add(folder_id)
+        self.timer.record_folder(folder.name, seconds)
+        if result.deletion is not None and not plan.keeps_folder:
+            self.metadata_cache.evict(folder.name)
+            if self.media_store is not None:
+                self.media_store.discard(folder)
+            if self.shrinker is not None:
+                self.shrinker.discard(folder)
+
+        self.__record_plan(plan)
+        if plan.images and self.background_store is not None:
+            self.background_store.add(folder, plan.images)
+        if plan.images and self.shrinker is not None:
+            self.shrinker.add(folder, plan.images)
+        if plan.media and self.media_store is not None:
+            self.media_store.add(folder, plan.media)
+        if plan.difficulties and self.mapset_index is not None:
+            self.mapset_index.add(folder, plan.difficulties)
+            if self.dry_run and plan.inventory is not None:
+                # Nothing was deleted, so the folder's remaining size can only be taken from its plan.
+                self._kept_inventories[folder] = plan.inventory
+
+        self.progress.step(
+            folder_id if folder_id is not None else -1, plan.size, plan.files_removed
+        )
+        processed_id = signature = None
+        if folder_id is not None and record:
+            self._in_flight_ids.discard(folder_id)
+            # After cleaning, record the ID as processed for this run and for future runs,
+            # with the signature of the cleaned folder to notice later changes.
+            # A dry run only remembers it for this run, to route duplicates the same way.
+            if plan.keeps_folder:
+                self._processed_in_this_run.add(folder_id)
+                if not self.dry_run:
+                    with self.timer.phase("signature"):
+                        signature = folder_signature(folder, plan.inventory)
+                    self.processed_folders.add(folder_id, signature)
+                    processed_id = folder_id
+        if self.dry_run:
+            return
 
-                # Save progress to the JSON file every 100 folders.
-                if (index + 1) % 100 == 0:
-                    self.__dump_proc_folders()
+        # The journal makes the folder's outcome durable right away...
+        self.journal.done(result.journal_entry, processed_id, signature)
+        # ...and every 100 folders it is folded into the processed index.
+        self._collected += 1
+        if self._collected % 100 == 0:
+            with self.timer.phase("index_flush"):
+                self.processed_folders.flush()
+                self.journal.checkpoint()
 
+    def __skip_unchanged(self, folder_id: int, signature: str | None):
+        """
+        Records the result of a folder that was processed by an earlier run and
+        hasn't changed. Its ID still counts as processed in this run, so any
+        later folder with the same ID is deleted as a duplicate.
+        """
+        self._in_flight_ids.discard(folder_id)
+        self._processed_in_this_run.add(folder_id)
+        if signature is not None and not self.dry_run:
+            # Only writes anything for an ID that had no signature yet.
+            self.processed_folders.add(folder_id, signature)
+        self.progress.step(folder_id)
+
+    def __load_osu_db(self):
+        """
+        Reads the difficulties of the deleted modes from `osu!.db`, if it is
+        there. The database is only an optimization, so if it can't be read
+        every difficulty is simply parsed.
+        """
+        if not self.osu_db_path.is_file():
+            return
+        try:
+            self.osu_db = OSUDbIndex.load(self.osu_db_path, self.params['delete_modes'])
+        except Exception as e:
+            print(f"Could not read {self.osu_db_path}, all difficulties will be parsed: {e}")
+            return
+        print(f"osu!.db: {len(self.osu_db)} difficulties of deleted modes")
+
+    def __resume_interrupted_run(self):
+        """
+        Finishes what an interrupted run left behind, see `RunJournal`: the IDs
+        of the folders it finished are saved as processed, so they are skipped,
+        and the plans it had begun are applied again, skipping the actions that
+        were already done.
+        """
+        plans, processed_ids = self.journal.recover(self.songs_folder)
+        if not plans and not processed_ids:
+            return
+        # "Force Clean" processes every folder again anyway.
+        if not self.params.get('force_clean', False):
+            for folder_id, signature in processed_ids:
+                self.processed_folders.add(folder_id, signature)
+
+        if plans:
+            self.progress.set_phase("resuming")
+            print(f"Resuming an interrupted run: finishing {len(plans)} folder plans")
+        for plan in plans:
+            try:
+                PlanExecutor.replay(plan, self.quarantine)
+            except (CleanError, OSUParsingError) as e:
+                raise e
+            except Exception as e:
+                raise CleanError(e, plan.folder)
+            if not plan.keeps_folder:
+                self.metadata_cache.evict(plan.folder.name)
+
+        self.processed_folders.flush()
+        self.journal.checkpoint()
+
+    def __record_plan(self, plan: FolderPlan):
+        """Adds a plan to the totals and, in a dry run, to the plan file."""
+        self.plan_totals.add(plan)
+        if self._plan_file is not None:
+            for action in plan.actions:
+                self._plan_file.write(json.dumps({"folder": plan.folder.name, **action.to_json()}) + "\n")
+
+    def __remove_duplicate_mapsets(self, pool: ThreadPoolExecutor):
+        """
+        Runs after all folders are cleaned: deletes folders whose difficulties
+        are all kept by another folder, see `MapsetIndex`.
+        """
+        assert self.mapset_index is not None
+        for folder, kept_by in self.mapset_index.find_redundant(pool):
+            try:
+                if self.dry_run:
+                    inventory = self._kept_inventories.get(folder) or FolderInventory(folder)
+                    size = sum(f.size for f in inventory.files if not inventory.is_removed(f.rel_path))
+                    plan = FolderPlan(folder, [CleanAction(ActionKind.DUPLICATE, str(folder), size)], False, inventory)
+                else:
+                    plan = FolderPlan.remove(folder, FolderInventory(folder), ActionKind.DUPLICATE)
+                self.__apply(plan)
             except (CleanError, OSUParsingError) as e:
                 raise e
             except Exception as e:
                 raise CleanError(e, folder)
+            print(f"Duplicate mapset: {folder.name} (all its difficulties are in {kept_by.name})")
+            self.__record_plan(plan)
+            self.progress.add_freed(plan.size, plan.files_removed)
+            if self.background_store is not None:
+                self.background_store.discard(folder)
+            if self.media_store is not None:
+                self.media_store.discard(folder)
+            if self.shrinker is not None:
+                self.shrinker.discard(folder)
+
+    def __dedupe_backgrounds(self, pool: ThreadPoolExecutor):
+        """
+        Runs after all folders are cleaned: stores each background that is kept
+        by more than one folder once and replaces its copies with links.
+        """
+        assert self.background_store is not None
+        for plan in self.background_store.plan(pool):
+            try:
+                self.__apply(plan)
+            except (CleanError, OSUParsingError) as e:
+                raise e
+            except Exception as e:
+                raise CleanError(e, plan.folder)
+            self.__record_plan(plan)
+            self.progress.add_freed(plan.size)
+            self.__refresh_signature(plan.folder)
 
-        # Final save of all processed IDs at the end of the run.
-        self.__dump_proc_folders()
+    def __shrink_backgrounds(self, pool: ThreadPoolExecutor):
+        """
+        Runs after all folders are cleaned: replaces each kept background with
+        a smaller version of it, see `BackgroundShrinker`.
+        """
+        assert self.shrinker is not None
+        try:
+            for plan in self.shrinker.plan(pool, self.dry_run):
+                try:
+                    self.__apply(plan)
+                except (CleanError, OSUParsingError) as e:
+                    raise e
+                except Exception as e:
+                    raise CleanError(e, plan.folder)
+                self.__record_plan(plan)
+                self.progress.add_freed(plan.size)
+                self.__refresh_signature(plan.folder)
+        finally:
+            # Applied plans moved their results into place; the rest must not stay in the folders.
+            if not self.dry_run:
+                BackgroundShrinker.remove_pending_outputs(self.songs_folder)
+
+    def __dedupe_media(self, pool: ThreadPoolExecutor):
+        """
+        Runs after all folders are cleaned: replaces each kept audio or video
+        file that is identical to one in another folder with a hard link to it.
+        """
+        assert self.media_store is not None
+        for plan in self.media_store.plan(pool):
+            try:
+                self.__apply(plan)
+            except (CleanError, OSUParsingError) as e:
+                raise e
+            except Exception as e:
+                raise CleanError(e, plan.folder)
+            self.__record_plan(plan)
+            self.progress.add_freed(plan.size)
+            self.__refresh_signature(plan.folder)
+
+    def __refresh_signature(self, folder: Path):
+        """Linking changed a processed folder after it was recorded, so its signature has to follow."""
+        folder_id = self._get_folder_id(folder)
+        if not self.dry_run and folder_id is not None and folder_id in self.processed_folders:
+            self.processed_folders.add(folder_id, folder_signature(folder))
+
+    def __write_report(self, started_at: float, error: BaseException | None):
+        """
+        Writes `clean_report.json`: the run's settings and outcome (with the
+        freed space by `SpaceCategory` in `totals.categories`), cumulative
+        time and call counts per phase, the slowest folders and, with the
+        `profile` option, the cProfile and tracemalloc results.
+
+        Planning worker phases: `scan`, `parse`, `plan` and
+        `deletion_backpressure` (waiting for a slot in the deletion stage).
+        Deletion stage phases: `execute.<action>`. Main thread phases: `wait`
+        and `wait_deletion` (for the oldest folder's plan and its execution),
+        `resume` (finishing an interrupted run), `osu_db`, `signature` (fingerprinting
+        processed folders, also on the planning workers), `index_flush`, `save`, and the
+        library-wide passes `duplicate_mapsets`, `dedupe_backgrounds`, `shrink_backgrounds`
+        and `dedupe_media`.
+        """
+        snapshot = self.progress.snapshot()
+        cache = self.metadata_cache
+        report = {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(started_at)),
+            "elapsed_s": round(time.time() - started_at, 3),
+            "songs_folder": str(self.songs_folder),
+            "workers": max(1, self.params.get('workers', 1)),
+            "dry_run": self.dry_run,
+            "error": None if error is None else f"{type(error).__name__}: {error}",
+            "folders": snapshot.done,
+            "folders_per_s": round(snapshot.folders_per_s, 2),
+            "totals": self.plan_totals.to_json(),
+            "metadata_cache": {"hits": cache.hits, "misses": cache.misses},
+            "quarantine": None if self.quarantine is None else str(self.quarantine.batch),
+            **self.timer.to_json(),
+        }
+        if self.profiler is not None:
+            try:
+                report["profile"] = self.profiler.stop()
+            except Exception as e:
+                # Same as below: a failed capture must not replace the run's own error.
+                print(f"Could not collect the profile: {e}")
+
+        try:
+            atomic_write_text(self.report_path, json.dumps(report, indent=4, ensure_ascii=False))
+        except OSError as e:
+            # The report must never hide the outcome of the run itself.
+            print(f"Could not write the run report: {e}")
+
+    def __finish_dry_run(self):
+        """Appends the totals to the plan file and prints a short summary."""
+        totals = self.plan_totals
+        with open(self.plan_path, 'a', encoding='utf-8') as plan_file:
+            plan_file.write(json.dumps({"totals": totals.to_json()}) + "\n")
+
+        print(f"Dry run, nothing was deleted. Plan written to {self.plan_path}")
+        for kind in ActionKind:
+            if totals.counts[kind]:
+                print(f"  {kind.value:<10} {totals.counts[kind]:>8} actions  {format_size(totals.bytes[kind]):>10}")
+        print(f"  Total: {format_size(totals.total_bytes)}, {totals.folders_removed} folders removed")
+        for category, size, files in totals.reclaimed_by_category():
+            print(f"  {category.value:<14} {files:>8} files    {format_size(size):>10}")
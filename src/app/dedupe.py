@@ -0,0 +1,325 @@
+import hashlib
+import json
+import os
+from collections import defaultdict
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from pathlib import Path
+
+from .clean_plan import ActionKind, CleanAction, FolderPlan
+from .file_utils import atomic_write_text
+from .folder_inventory import InventoryFile
+
+# Files are hashed in chunks, so a multi-MB image or song is never read into memory at once.
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path: str | Path) -> str:
+    """Returns the hex BLAKE2b digest of a file's contents, reading it in chunks."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def try_hash_file(path: str | Path) -> str | None:
+    """Like `hash_file`, but returns `None` for a file that was removed or locked since it was scanned."""
+    try:
+        return hash_file(path)
+    except OSError as e:
+        print(f"Could not hash {path}: {e}")
+        return None
+
+
+class BackgroundStore:
+    """
+    A content-addressed store for background images shared by several beatmap
+    folders ("Keep + Dedupe" mode).
+
+    While cleaning, the kept background images of every cleaned folder are
+    registered with `add`. Once all folders are done, `plan` finds identical
+    images and plans to keep each of them once, as `<digest><suffix>` inside the
+    store directory, with every copy in the Songs folder replaced by a symlink:
+    the first copy is moved into the store (`STORE`), the others are deleted
+    and linked (`SYMLINK`). An image that matches one already in the store from
+    a previous run is linked to it directly.
+
+    Only files of the same size can be identical, so images are first bucketed
+    by size and only buckets with more than one file (or with a stored image of
+    that size) are hashed. Unique images are never read.
+    """
+    root: Path
+    _candidates: list[tuple[Path, InventoryFile]]
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._candidates = []
+
+    def add(self, folder: Path, images: list[InventoryFile]):
+        """Registers the kept background images of a cleaned folder."""
+        self._candidates.extend((folder, image) for image in images)
+
+    def discard(self, folder: Path):
+        """Forgets the images of a folder, e.g. because the folder was deleted."""
+        self._candidates = [c for c in self._candidates if c[0] != folder]
+
+    def __stored_by_size(self) -> dict[int, dict[str, Path]]:
+        """The images already in the store, by size and digest (taken from the filename)."""
+        stored: dict[int, dict[str, Path]] = defaultdict(dict)
+        if not self.root.is_dir():
+            return stored
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if entry.is_file(follow_symlinks=False):
+                    digest = entry.name.partition(".")[0]
+                    stored[entry.stat().st_size][digest] = Path(entry.path)
+        return stored
+
+    def plan(self, pool: Executor | None = None) -> list[FolderPlan]:
+        """
+        Plans the deduplication of all registered images. Files are hashed on
+        `pool`, if given. Every returned plan touches a single folder and a
+        single digest, and a digest's `STORE` plan always comes before the
+        plans that link to it.
+        """
+        stored = self.__stored_by_size()
+        by_size: dict[int, list[tuple[Path, InventoryFile]]] = defaultdict(list)
+        for folder, image in self._candidates:
+            by_size[image.size].append((folder, image))
+
+        to_hash = [
+            candidate
+            for size, group in by_size.items()
+            if len(group) > 1 or size in stored
+            for candidate in group
+        ]
+        paths = [image.path for _, image in to_hash]
+        digests = pool.map(try_hash_file, paths) if pool is not None else map(try_hash_file, paths)
+
+        by_digest: dict[tuple[int, str], list[tuple[Path, InventoryFile]]] = defaultdict(list)
+        for candidate, digest in zip(to_hash, digests):
+            if digest is not None:
+                by_digest[(candidate[1].size, digest)].append(candidate)
+
+        plans: list[FolderPlan] = []
+        for (size, digest), copies in by_digest.items():
+            target = stored.get(size, {}).get(digest)
+            if target is None:
+                # A new image is only worth storing if it has at least two copies.
+                if len(copies) < 2:
+                    continue
+                folder, image = copies.pop(0)
+                target = self.root / (digest + Path(image.rel_path).suffix.lower())
+                plans.append(FolderPlan(
+                    folder, [CleanAction(ActionKind.STORE, image.path, target=str(target))], True
+                ))
+
+            for folder, image in copies:
+                plans.append(FolderPlan(folder, [CleanAction(
+                    ActionKind.SYMLINK, image.path, image.size, target=str(target), replaces=image.path
+                )], True))
+        return plans
+
+
+@dataclass
+class _MediaFile:
+    """A kept audio or video file, registered in this run or known from the hash index."""
+
+    folder: Path
+    rel_path: str
+    size: int
+    mtime_ns: int
+    digest: str | None
+    """The file's hash, or `None` if it never had to be hashed (or has changed since)."""
+    new: bool
+    """Whether the file was registered in this run."""
+    exists: bool = True
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.folder, self.rel_path)
+
+
+class MediaStore:
+    """
+    Finds audio and video files that are kept by several beatmap folders
+    ("Dedupe audio/video"): the same song often comes with many mapsets, byte
+    for byte, and after cleaning these are the bulk of the library.
+
+    As with `BackgroundStore`, the kept media of every cleaned folder are
+    registered with `add`, and once all folders are done `plan` finds the
+    identical ones, bucketed by size first and hashed only where a size occurs
+    more than once. Each set of copies is collapsed onto the oldest known copy,
+    which stays where it is, and every other copy is replaced by a hard link to
+    it (`HARDLINK`). No separate store is needed: the data lives on as long as
+    any beatmap still links to it, and goes away with the last one.
+
+    What was learned is kept in `media_hashes.json` in the Songs folder: the
+    size, mtime and, if it was ever computed, digest of each kept file, grouped
+    by folder. Later runs compare only the newly cleaned folders against it, so
+    a file is read at most once while its size and mtime don't change, and a
+    file of a unique size is never read at all.
+    """
+    FILENAME = "media_hashes.json"
+    VERSION = 1
+
+    songs_folder: Path
+    path: Path
+    _folders: dict[str, dict[str, list]]
+    """`[size, mtime_ns, digest]` of each known file, by folder and relative path."""
+    _candidates: dict[str, list[InventoryFile]]
+    _seen: set[str]
+    _dirty: bool
+
+    def __init__(self, songs_folder: Path):
+        self.songs_folder = songs_folder
+        self.path = songs_folder / self.FILENAME
+        self._candidates = {}
+        self._seen = set()
+        self._dirty = False
+        self._folders = self.__load()
+
+    def __load(self) -> dict[str, dict[str, list]]:
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as index_file:
+                data = json.load(index_file)
+            if data.get("version") != self.VERSION or not isinstance(data["folders"], dict):
+                raise ValueError(f"unsupported index version {data.get('version')}")
+            return data["folders"]
+        except Exception as e:
+            print(f"Media hash index is unreadable and will be rebuilt: {e}")
+            self._dirty = True
+            return {}
+
+    def touch(self, folder_name: str):
+        """Marks a folder as present in the Songs directory during this run."""
+        self._seen.add(folder_name)
+
+    def add(self, folder: Path, files: list[InventoryFile]):
+        """Registers the kept audio and video files of a cleaned folder."""
+        self._candidates[folder.name] = files
+        self._seen.add(folder.name)
+
+    def discard(self, folder: Path):
+        """Forgets the files of a folder, e.g. because the folder was deleted."""
+        self._candidates.pop(folder.name, None)
+        if self._folders.pop(folder.name, None) is not None:
+            self._dirty = True
+
+    def plan(self, pool: Executor | None = None) -> list[FolderPlan]:
+        """
+        Plans hard links for the registered files and updates the index with
+        their sizes and digests. Files are hashed on `pool`, if given. Every
+        returned plan replaces a single file.
+        """
+        by_size = self.__files_by_size()
+        # Only sizes shared with a newly registered file can hold new duplicates.
+        groups = [group for group in by_size.values() if len(group) > 1 and any(m.new for m in group)]
+
+        to_hash = [media for group in groups for media in group if media.digest is None]
+        paths = [media.path for media in to_hash]
+        digests = pool.map(try_hash_file, paths) if pool is not None else map(try_hash_file, paths)
+        for media, digest in zip(to_hash, digests):
+            media.digest = digest
+
+        plans: list[FolderPlan] = []
+        for group in groups:
+            by_digest: dict[str, list[_MediaFile]] = defaultdict(list)
+            for media in group:
+                if media.digest is not None:
+                    by_digest[media.digest].append(media)
+            for copies in by_digest.values():
+                if len(copies) > 1:
+                    plans.extend(self.__plan_links(copies))
+
+        self.__update_index(by_size)
+        return plans
+
+    def save(self):
+        """
+        Evicts folders that no longer exist and writes the index atomically,
+        the same way as `MetadataCache.save`. Nothing is written if nothing changed.
+        """
+        for folder_name in list(self._folders):
+            if folder_name not in self._seen and not os.path.isdir(self.songs_folder / folder_name):
+                del self._folders[folder_name]
+                self._dirty = True
+        if not self._dirty:
+            return
+        data = {"version": self.VERSION, "folders": self._folders}
+        atomic_write_text(self.path, json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+        self._dirty = False
+
+    def __files_by_size(self) -> dict[int, list[_MediaFile]]:
+        """
+        Every known and registered file, by size. Known files come first, so a
+        set of copies is linked to the copy earlier runs already linked to.
+        A registered file reuses its indexed digest while its size and mtime match.
+        """
+        by_size: dict[int, list[_MediaFile]] = defaultdict(list)
+        for folder_name, files in self._folders.items():
+            if folder_name in self._candidates:
+                continue  # Replaced by what the folder keeps now.
+            for rel_path, (size, mtime_ns, digest) in files.items():
+                by_size[size].append(_MediaFile(
+                    self.songs_folder / folder_name, rel_path, size, mtime_ns, digest, False
+                ))
+        for folder_name, files in self._candidates.items():
+            indexed = self._folders.get(folder_name, {})
+            for file in files:
+                entry = indexed.get(file.rel_path)
+                digest = None
+                if entry is not None and entry[0] == file.size and entry[1] == file.mtime_ns:
+                    digest = entry[2]  # Unchanged since it was hashed.
+                by_size[file.size].append(_MediaFile(
+                    self.songs_folder / folder_name, file.rel_path, file.size, file.mtime_ns, digest, True
+                ))
+        return by_size
+
+    @staticmethod
+    def __plan_links(copies: list[_MediaFile]) -> list[FolderPlan]:
+        """
+        Plans to link every copy of a file to the first copy that is still as
+        it was hashed. Each copy is `stat`ed for its inode, so copies that are
+        already linked to it, by an earlier run, are left alone.
+        """
+        plans: list[FolderPlan] = []
+        target: _MediaFile | None = None
+        target_id = (0, 0)
+        for media in copies:
+            try:
+                file_stat = os.stat(media.path)
+            except OSError:
+                media.exists = False
+                continue
+            if file_stat.st_size != media.size or file_stat.st_mtime_ns != media.mtime_ns:
+                media.digest = None  # Changed since it was hashed, so it is hashed again when it matters.
+                continue
+            if target is None:
+                target, target_id = media, (file_stat.st_dev, file_stat.st_ino)
+                continue
+            # Hard links can't cross volumes.
+            if (file_stat.st_dev, file_stat.st_ino) == target_id or file_stat.st_dev != target_id[0]:
+                continue
+            plans.append(FolderPlan(media.folder, [CleanAction(
+                ActionKind.HARDLINK, media.path, media.size, target=target.path
+            )], True))
+            # A hard link shares its target's metadata.
+            media.mtime_ns = target.mtime_ns
+        return plans
+
+    def __update_index(self, by_size: dict[int, list[_MediaFile]]):
+        folders: dict[str, dict[str, list]] = {}
+        for group in by_size.values():
+            for media in group:
+                if media.exists:
+                    folders.setdefault(media.folder.name, {})[media.rel_path] = [
+                        media.size, media.mtime_ns, media.digest
+                    ]
+        if folders != self._folders:
+            self._folders = folders
+            self._dirty = True
+        self._candidates.clear()
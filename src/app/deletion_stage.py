@@ -0,0 +1,75 @@
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import BoundedSemaphore
+from typing import Callable
+
+from ..exceptions import CleanError
+from .clean_plan import FolderPlan, PlanExecutor
+from .instrumentation import PhaseTimer
+from .quarantine import Quarantine
+
+
+class DeletionStage:
+    """
+    The second stage of the cleaning pipeline: executes folder plans on its
+    own threads, so the planning workers (scanning and parsing, mostly CPU)
+    can move on to the next folder while the previous one is still being
+    deleted (mostly I/O, and slow on spinning disks or with real-time
+    antivirus scanning).
+
+    At most `capacity` plans are queued or running at a time; `submit` blocks
+    the calling worker until a slot is free. This backpressure keeps the
+    planned-but-not-yet-deleted folders (and their inventories) bounded in
+    memory.
+
+    Each submitted plan gets its own future, which resolves to the seconds
+    spent executing it, or raises a `CleanError` naming the plan's folder.
+    """
+    timer: PhaseTimer | None
+    quarantine: Quarantine | None
+    _slots: BoundedSemaphore
+    _pool: ThreadPoolExecutor
+
+    def __init__(
+        self,
+        workers: int,
+        capacity: int,
+        timer: PhaseTimer | None = None,
+        initializer: Callable[[], None] | None = None,
+        quarantine: Quarantine | None = None
+    ):
+        self.timer = timer
+        self.quarantine = quarantine
+        self._slots = BoundedSemaphore(capacity)
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="deleter", initializer=initializer
+        )
+
+    def submit(self, plan: FolderPlan) -> "Future[float]":
+        """Queues a plan for execution, waiting while the queue is full."""
+        start = time.perf_counter()
+        self._slots.acquire()
+        if self.timer is not None:
+            self.timer.add("deletion_backpressure", time.perf_counter() - start)
+        try:
+            future = self._pool.submit(self.__execute, plan)
+        except BaseException:
+            self._slots.release()
+            raise
+        # Released when the plan is done, failed or cancelled.
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def __execute(self, plan: FolderPlan) -> float:
+        start = time.perf_counter()
+        try:
+            PlanExecutor.execute(plan, self.timer, self.quarantine)
+        except CleanError as e:
+            raise e
+        except Exception as e:
+            raise CleanError(e, plan.folder)
+        return time.perf_counter() - start
+
+    def shutdown(self, cancel_futures: bool = False):
+        """Waits for the running plans. With `cancel_futures`, queued plans are dropped."""
+        self._pool.shutdown(wait=True, cancel_futures=cancel_futures)
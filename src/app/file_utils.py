@@ -0,0 +1,29 @@
+import os
+from pathlib import Path
+
+
+def atomic_write_text(path: Path, text: str, encoding: str = 'utf-8'):
+    """
+    Writes `text` to `path` so that readers only ever see the old or the new
+    contents, never a half-written file.
+
+    The data is written to a temporary sibling file, flushed to disk and then
+    moved over the destination with `os.replace`, which is atomic on both
+    Windows and POSIX as long as both paths are on the same volume.
+    """
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'w', encoding=encoding, newline='\n') as tmp_file:
+        tmp_file.write(text)
+        tmp_file.flush()
+        os.fsync(tmp_file.fileno())
+    os.replace(tmp_path, path)
+
+
+def format_size(size: int) -> str:
+    """Formats a number of bytes for humans, e.g. `1.5 GB`."""
+    value = float(size)
+    for unit in ("B", "KB", "MB", "GB"):
+        if value < 1024:
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} TB"
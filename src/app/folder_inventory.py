@@ -0,0 +1,112 @@
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+
+@dataclass
+class InventoryFile:
+    """A single file (or file symlink) found while scanning a beatmap folder."""
+
+    path: str
+    """The full path to the file."""
+    rel_path: str
+    """The path relative to the beatmap folder, with forward slashes and original casing."""
+    size: int
+    """The size in bytes, as reported by the directory scan."""
+    mtime_ns: int
+    """The modification time in nanoseconds, as reported by the directory scan."""
+    is_symlink: bool
+    """Whether the entry is a symbolic link (e.g. a background replaced on a previous run)."""
+
+
+@dataclass
+class InventoryDir:
+    """A subdirectory found while scanning a beatmap folder."""
+
+    path: str
+    """The full path to the directory."""
+    rel_path: str
+    """The path relative to the beatmap folder, with forward slashes."""
+    depth: int
+    """How deep the directory is nested; direct children of the beatmap folder have depth 1."""
+
+
+class FolderInventory:
+    """
+    A snapshot of a beatmap folder's tree, built with a single `os.scandir`
+    pass per directory.
+
+    Every cleaning phase (finding .osu files, matching the keep set, pruning
+    empty directories and the final "is any .osu left?" check) works from this
+    snapshot instead of listing or walking the folder again. The size and
+    mtime of each file come from the scan itself, which on Windows costs no
+    extra system calls.
+
+    Phases that delete something report it back with `discard`, which keeps
+    a per-directory count of entries that are still present on disk.
+    """
+    root: Path
+    files: list[InventoryFile]
+    dirs: list[InventoryDir]
+    _entry_counts: dict[str, int]
+    _removed: set[str]
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.files = []
+        self.dirs = []
+        self._entry_counts = {}
+        self._removed = set()
+        self.__scan()
+
+    def __scan(self):
+        stack: list[tuple[str, str, int]] = [(str(self.root), "", 0)]
+        while stack:
+            dir_path, rel_dir, depth = stack.pop()
+            entries = 0
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    entries += 1
+                    rel_path = rel_dir + entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        self.dirs.append(InventoryDir(entry.path, rel_path, depth + 1))
+                        stack.append((entry.path, rel_path + "/", depth + 1))
+                    elif entry.is_dir():
+                        # A symlink to a directory: never descended into nor deleted.
+                        continue
+                    else:
+                        stat = entry.stat(follow_symlinks=False)
+                        self.files.append(InventoryFile(
+                            entry.path, rel_path, stat.st_size,
+                            stat.st_mtime_ns, entry.is_symlink()
+                        ))
+            self._entry_counts[rel_dir.rstrip("/")] = entries
+
+    @property
+    def osu_files(self) -> list[InventoryFile]:
+        """The .osu files that are present directly in the beatmap folder."""
+        return [
+            f for f in self.files
+            if "/" not in f.rel_path and f.rel_path.lower().endswith(".osu")
+        ]
+
+    def discard(self, rel_path: str):
+        """Marks a file or directory as removed from disk."""
+        self._removed.add(rel_path)
+        self._entry_counts[rel_path.rpartition("/")[0]] -= 1
+
+    def has_osu_files(self) -> bool:
+        """Whether any .osu file directly in the beatmap folder is still present on disk."""
+        return any(f.rel_path not in self._removed for f in self.osu_files)
+
+    def is_removed(self, rel_path: str) -> bool:
+        """Whether the file or directory was reported as removed with `discard`."""
+        return rel_path in self._removed
+
+    def is_empty(self, rel_dir: str) -> bool:
+        """Whether the directory has no entries left on disk."""
+        return self._entry_counts.get(rel_dir, 0) == 0
+
+    def dirs_bottom_up(self) -> list[InventoryDir]:
+        """All subdirectories ordered so that children come before their parents."""
+        return sorted(self.dirs, key=lambda d: d.depth, reverse=True)
@@ -0,0 +1,149 @@
+import cProfile
+import heapq
+import io
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from threading import Lock
+from typing import Callable, Iterator
+
+
+class PhaseTimer:
+    """
+    Cumulative wall time and call counts per phase of a run, plus the slowest
+    folders. Safe to use from the worker threads.
+
+    Phases that run on the workers overlap, so their times add up to more
+    than the run's wall time; they show where the work goes, not how long
+    the run took.
+    """
+    slowest_count: int
+    _phases: dict[str, list[float]]
+    _slowest: list[tuple[float, str]]
+    _lock: Lock
+
+    def __init__(self, slowest_count: int = 20):
+        self.slowest_count = slowest_count
+        self._phases = {}
+        self._slowest = []
+        self._lock = Lock()
+
+    def add(self, phase: str, seconds: float, calls: int = 1):
+        """Adds already measured time to a phase, e.g. to record a batch at once."""
+        with self._lock:
+            entry = self._phases.get(phase)
+            if entry is None:
+                self._phases[phase] = [seconds, calls]
+            else:
+                entry[0] += seconds
+                entry[1] += calls
+
+    @contextmanager
+    def phase(self, phase: str) -> Iterator[None]:
+        """Times the enclosed block as one call of `phase`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+
+    def record_folder(self, folder_name: str, seconds: float):
+        """Keeps the `slowest_count` slowest folders in a min-heap."""
+        with self._lock:
+            if len(self._slowest) < self.slowest_count:
+                heapq.heappush(self._slowest, (seconds, folder_name))
+            elif seconds > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, (seconds, folder_name))
+
+    def to_json(self) -> dict:
+        with self._lock:
+            phases = {
+                name: {"seconds": round(seconds, 6), "calls": calls}
+                for name, (seconds, calls) in sorted(self._phases.items(), key=lambda p: -p[1][0])
+            }
+            slowest = [
+                {"folder": name, "seconds": round(seconds, 6)}
+                for seconds, name in sorted(self._slowest, reverse=True)
+            ]
+        return {"phases": phases, "slowest_folders": slowest}
+
+
+class RunProfiler:
+    """
+    An opt-in cProfile and tracemalloc capture of a whole run.
+
+    Before Python 3.12, `cProfile` only sees the thread it was enabled on, so
+    every worker thread enables its own profiler through `thread_initializer`
+    (passed to the pool as its `initializer`); all of them are merged into one
+    report at the end. From 3.12 on, a profiler sees every thread and only one
+    may be active at a time, so the one started by `start` is enough.
+    """
+    TOP_FUNCTIONS = 40
+    TOP_ALLOCATIONS = 15
+
+    _profiles: list[cProfile.Profile]
+    _lock: Lock
+
+    def __init__(self):
+        self._profiles = []
+        self._lock = Lock()
+
+    def start(self):
+        tracemalloc.start()
+        self.enable_thread()
+
+    @property
+    def thread_initializer(self) -> Callable[[], None] | None:
+        """The pool initializer that starts profiling each worker thread, if one is needed."""
+        return self.enable_thread if sys.version_info < (3, 12) else None
+
+    def enable_thread(self):
+        """Starts profiling the calling thread."""
+        profile = cProfile.Profile()
+        profile.enable()
+        with self._lock:
+            self._profiles.append(profile)
+
+    def stop(self) -> dict:
+        """Stops the capture and returns its results as JSON data."""
+        allocations = []
+        if tracemalloc.is_tracing():
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            for stat in snapshot.statistics('lineno')[:self.TOP_ALLOCATIONS]:
+                frame = stat.traceback[0]
+                allocations.append({
+                    "location": f"{frame.filename}:{frame.lineno}",
+                    "size": stat.size,
+                    "count": stat.count,
+                })
+        else:
+            peak = 0
+
+        stats = pstats.Stats(stream=io.StringIO())
+        with self._lock:
+            for profile in self._profiles:
+                profile.disable()
+                stats.add(profile)
+            self._profiles.clear()
+
+        functions = []
+        stats.sort_stats(pstats.SortKey.CUMULATIVE)
+        for func in stats.fcn_list[:self.TOP_FUNCTIONS]:  # type: ignore[attr-defined]
+            _, calls, tottime, cumtime, _ = stats.stats[func]  # type: ignore[attr-defined]
+            filename, lineno, name = func
+            functions.append({
+                "function": f"{filename}:{lineno}({name})",
+                "calls": calls,
+                "tottime": round(tottime, 6),
+                "cumtime": round(cumtime, 6),
+            })
+
+        return {
+            "peak_memory": peak,
+            "top_allocations": allocations,
+            "top_functions": functions,
+        }
@@ -0,0 +1,109 @@
+from collections import defaultdict
+from concurrent.futures import Executor
+from pathlib import Path
+
+from .dedupe import try_hash_file
+from .folder_inventory import InventoryFile
+from .osu_parser import OSUFile
+
+# A key that identifies a single difficulty independently of its folder:
+# ("id", BeatmapID) for submitted maps, ("hash", digest) for the rest, and
+# ("file", path) for files whose size alone shows they have no copy elsewhere.
+DifficultyKey = tuple[str, int | str]
+
+
+class MapsetIndex:
+    """
+    Finds beatmap folders that hold the same mapset as another folder, whatever
+    the folders are called: re-downloads under a different name, folders
+    without an ID and re-imports with a suffix.
+
+    Every cleaned folder is registered with `add`, along with the difficulties
+    it keeps. Each difficulty is identified by its `BeatmapID`; difficulties
+    without one (unsubmitted or very old maps) are identified by a hash of the
+    .osu file instead. A folder is redundant if the difficulties it keeps are
+    the same as, or a subset of, those kept by another folder. Of several
+    identical folders the one whose newest .osu file is the most recent is
+    kept, since an updated re-download keeps the same `BeatmapID`s; on a tie
+    the first one registered is kept.
+
+    Two .osu files can only have the same content if they have the same size,
+    so only files without a `BeatmapID` that share their size with such a file
+    in another folder are hashed.
+    """
+    _folders: list[Path]
+    _ids: dict[Path, set[int]]
+    _unidentified: dict[Path, list[InventoryFile]]
+    _newest_mtimes: dict[Path, int]
+
+    def __init__(self):
+        self._folders = []
+        self._ids = {}
+        self._unidentified = {}
+        self._newest_mtimes = {}
+
+    def add(self, folder: Path, difficulties: list[tuple[InventoryFile, OSUFile]]):
+        """Registers a cleaned folder and the difficulties it keeps."""
+        if not difficulties:
+            return
+        self._folders.append(folder)
+        self._ids[folder] = {o.beatmap_id for _, o in difficulties if o.beatmap_id is not None}
+        self._unidentified[folder] = [f for f, o in difficulties if o.beatmap_id is None]
+        self._newest_mtimes[folder] = max(f.mtime_ns for f, _ in difficulties)
+
+    def __hash_candidates(self, pool: Executor | None) -> dict[str, str]:
+        """Hashes the ID-less .osu files whose size occurs in more than one folder, by path."""
+        folders_by_size: dict[int, set[Path]] = defaultdict(set)
+        for folder, files in self._unidentified.items():
+            for file in files:
+                folders_by_size[file.size].add(folder)
+
+        paths = [
+            file.path
+            for files in self._unidentified.values()
+            for file in files
+            if len(folders_by_size[file.size]) > 1
+        ]
+        digests = pool.map(try_hash_file, paths) if pool is not None else map(try_hash_file, paths)
+        return {path: digest for path, digest in zip(paths, digests) if digest is not None}
+
+    def find_redundant(self, pool: Executor | None = None) -> list[tuple[Path, Path]]:
+        """
+        Returns the folders whose difficulties are all kept by another folder,
+        each with a folder that keeps them, in the order they were registered.
+        Files are hashed on `pool`, if given.
+        """
+        digests = self.__hash_candidates(pool)
+
+        keys: dict[Path, set[DifficultyKey]] = {}
+        for folder in self._folders:
+            folder_keys: set[DifficultyKey] = {("id", beatmap_id) for beatmap_id in self._ids[folder]}
+            for file in self._unidentified[folder]:
+                digest = digests.get(file.path)
+                # A file that wasn't hashed is unique, so the folder can't be anyone's subset.
+                folder_keys.add(("hash", digest) if digest is not None else ("file", file.path))
+            keys[folder] = folder_keys
+
+        folders_by_key: dict[DifficultyKey, list[Path]] = defaultdict(list)
+        for folder in self._folders:
+            for key in keys[folder]:
+                folders_by_key[key].append(folder)
+
+        # Of identical folders, the one with the newest .osu file ranks highest, then the first one.
+        rank = {
+            folder: (self._newest_mtimes[folder], -index)
+            for index, folder in enumerate(self._folders)
+        }
+        redundant: list[tuple[Path, Path]] = []
+        for folder in self._folders:
+            folder_keys = keys[folder]
+            # Only folders that share the rarest key can contain all of them.
+            rarest = min(folder_keys, key=lambda k: len(folders_by_key[k]))
+            for other in folders_by_key[rarest]:
+                if other == folder or not folder_keys <= keys[other]:
+                    continue
+                # A proper superset always wins; of identical folders the highest ranked one is kept.
+                if len(keys[other]) > len(folder_keys) or rank[other] > rank[folder]:
+                    redundant.append((folder, other))
+                    break
+        return redundant
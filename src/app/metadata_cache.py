@@ -0,0 +1,146 @@
+import json
+import os
+from pathlib import Path
+from threading import Lock
+
+from .file_utils import atomic_write_text
+from .folder_inventory import InventoryFile
+from .osu_parser import OSUFile
+from .types import OSUGameModes
+
+
+class MetadataCache:
+    """
+    An on-disk cache of parsed `OSUFile` results, stored next to the processed
+    index as `parsed_metadata_cache.json`.
+
+    Entries are grouped by beatmap folder, keyed by the .osu filename and
+    stored as `[size, mtime_ns, audio, images, videos, mode, beatmap_id,
+    beatmapset_id]`. An entry is only used if the file's size and mtime (taken
+    from the folder's `FolderInventory`) still match, so any edited difficulty
+    is parsed again.
+    Whenever a folder is parsed its whole group is replaced, which drops
+    entries for files that are gone, and folders that were deleted (by the
+    cleaner or by the user) are evicted on `save`.
+
+    A missing, unreadable or corrupted cache file is simply rebuilt.
+    """
+    FILENAME = "parsed_metadata_cache.json"
+    VERSION = 2
+
+    path: Path
+    songs_folder: Path
+    hits: int
+    misses: int
+    _folders: dict[str, dict[str, list]]
+    _seen: set[str]
+    _dirty: bool
+    _lock: Lock
+
+    def __init__(self, songs_folder: Path):
+        self.songs_folder = songs_folder
+        self.path = songs_folder / self.FILENAME
+        self.hits = 0
+        self.misses = 0
+        self._seen = set()
+        self._dirty = False
+        self._lock = Lock()
+        self._folders = self.__load()
+
+    def __load(self) -> dict[str, dict[str, list]]:
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as cache_file:
+                data = json.load(cache_file)
+            if data.get("version") != self.VERSION or not isinstance(data["folders"], dict):
+                raise ValueError(f"unsupported cache version {data.get('version')}")
+            return data["folders"]
+        except Exception as e:
+            print(f"Metadata cache is unreadable and will be rebuilt: {e}")
+            self._dirty = True
+            return {}
+
+    def lookup(self, folder_name: str, file: InventoryFile) -> OSUFile | None:
+        """Returns the cached result for `file` if the file hasn't changed since it was parsed."""
+        entry = self._folders.get(folder_name, {}).get(file.rel_path)
+        osu_file = None
+        try:
+            if entry is not None and entry[0] == file.size and entry[1] == file.mtime_ns:
+                osu_file = OSUFile(
+                    file.rel_path.lower(),
+                    entry[2],
+                    set(entry[3]),
+                    set(entry[4]),
+                    OSUGameModes(entry[5]),
+                    entry[6],
+                    entry[7]
+                )
+        except (IndexError, TypeError, ValueError):
+            pass  # A malformed entry is treated as a miss and overwritten.
+
+        with self._lock:
+            if osu_file is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return osu_file
+
+    def touch(self, folder_name: str):
+        """Marks a folder as present in the Songs directory during this run."""
+        self._seen.add(folder_name)
+
+    def update_folder(self, folder_name: str, results: list[tuple[InventoryFile, OSUFile]]):
+        """Replaces everything cached for `folder_name` with freshly looked-up results."""
+        entries = {
+            file.rel_path: [
+                file.size,
+                file.mtime_ns,
+                osu_file.audio_filename,
+                sorted(osu_file.image_filenames),
+                sorted(osu_file.video_filenames),
+                osu_file.mode.value,
+                osu_file.beatmap_id,
+                osu_file.beatmapset_id
+            ]
+            for file, osu_file in results
+        }
+        with self._lock:
+            self._seen.add(folder_name)
+            if self._folders.get(folder_name) != entries:
+                self._folders[folder_name] = entries
+                self._dirty = True
+
+    def evict(self, folder_name: str):
+        """Forgets a folder, e.g. because it was deleted."""
+        with self._lock:
+            if self._folders.pop(folder_name, None) is not None:
+                self._dirty = True
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def save(self):
+        """
+        Evicts folders that no longer exist and writes the cache atomically.
+        Folders passed to `touch` or `update_folder` during this run are known to
+        exist, so only the others are checked on disk. Nothing is written if
+        nothing changed.
+        """
+        with self._lock:
+            for folder_name in list(self._folders):
+                if folder_name in self._seen:
+                    continue
+                if not os.path.isdir(self.songs_folder / folder_name):
+                    del self._folders[folder_name]
+                    self._dirty = True
+                else:
+                    self._seen.add(folder_name)
+
+            if not self._dirty:
+                return
+            data = {"version": self.VERSION, "folders": self._folders}
+            atomic_write_text(self.path, json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+            self._dirty = False
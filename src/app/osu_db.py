@@ -0,0 +1,256 @@
+import mmap
+import struct
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+from .folder_inventory import InventoryFile
+from .types import OSUGameModes
+
+# A reader for osu!'s own beatmap index, `osu!.db`, next to `osu!.exe`.
+# The format is documented at https://github.com/ppy/osu/wiki/Legacy-database-file-structure
+#
+# The file is memory-mapped and read one beatmap at a time, so only the fields
+# the cleaner needs are ever turned into Python objects; everything else is
+# skipped over by its size.
+
+# Versions that changed the layout of a beatmap entry: from 20140609 on, AR/CS/HP/OD
+# are singles, star ratings are stored and an unknown short is gone; from 20191106
+# on, entries no longer start with their size in bytes.
+_VERSION_FLOAT_DIFFICULTY = 20140609
+_VERSION_NO_ENTRY_SIZE = 20191106
+
+# .NET DateTime ticks (100 ns since 0001-01-01) at the Unix epoch.
+_TICKS_AT_EPOCH = 621355968000000000
+# How far a difficulty's mtime may be from the one osu! recorded (filesystems round differently).
+_MTIME_TOLERANCE_NS = 2_000_000_000
+
+_INT = struct.Struct("<i")
+_LONG = struct.Struct("<q")
+
+
+@dataclass
+class OSUDbBeatmap:
+    """The fields of a single difficulty in `osu!.db` that the cleaner uses."""
+
+    folder_name: str
+    """The beatmap folder, relative to the Songs folder."""
+    osu_filename: str
+    audio_filename: str
+    mode: OSUGameModes
+    beatmap_id: int | None
+    beatmapset_id: int | None
+    modified_ns: int
+    """When osu! last saw the .osu file change, in nanoseconds since the Unix epoch."""
+    last_played_ns: int | None = None
+    """When the difficulty was last played, in nanoseconds since the Unix epoch, or `None` if never."""
+
+
+class _Cursor:
+    """Reads osu!'s primitive types from a buffer, moving forward."""
+
+    def __init__(self, buffer: mmap.mmap):
+        self.buffer = buffer
+        self.pos = 0
+
+    def skip(self, size: int):
+        self.pos += size
+
+    def byte(self) -> int:
+        value = self.buffer[self.pos]
+        self.pos += 1
+        return value
+
+    def int32(self) -> int:
+        value = _INT.unpack_from(self.buffer, self.pos)[0]
+        self.pos += 4
+        return value
+
+    def long(self) -> int:
+        value = _LONG.unpack_from(self.buffer, self.pos)[0]
+        self.pos += 8
+        return value
+
+    def __string_length(self) -> int:
+        """Reads a string's header: 0x00 for no string, or 0x0b and a ULEB128 length."""
+        marker = self.byte()
+        if marker == 0x00:
+            return 0
+        if marker != 0x0b:
+            raise ValueError(f"invalid string marker {marker:#x} at offset {self.pos - 1}")
+        length = shift = 0
+        while True:
+            part = self.byte()
+            length |= (part & 0x7f) << shift
+            if not part & 0x80:
+                return length
+            shift += 7
+
+    def string(self) -> str:
+        length = self.__string_length()
+        value = self.buffer[self.pos:self.pos + length].decode("utf-8", errors="replace")
+        self.pos += length
+        return value
+
+    def skip_string(self):
+        length = self.__string_length()
+        self.pos += length
+
+
+class OSUDatabase:
+    """
+    A memory-mapped `osu!.db`. Iterating over it streams its difficulties as
+    `OSUDbBeatmap`s; the file is only read as far as the iteration goes.
+    """
+    path: Path
+    version: int
+    beatmap_count: int
+    _mmap: mmap.mmap
+    _entries_start: int
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, 'rb') as db_file:
+            self._mmap = mmap.mmap(db_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            cursor = _Cursor(self._mmap)
+            self.version = cursor.int32()
+            cursor.int32()  # Folder count.
+            cursor.skip(1 + 8)  # Account unlocked, and the date it gets unlocked.
+            cursor.skip_string()  # Player name.
+            self.beatmap_count = cursor.int32()
+            self._entries_start = cursor.pos
+        except BaseException:
+            self._mmap.close()
+            raise
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self) -> "OSUDatabase":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def __iter__(self) -> Iterator[OSUDbBeatmap]:
+        cursor = _Cursor(self._mmap)
+        cursor.pos = self._entries_start
+        for _ in range(self.beatmap_count):
+            yield self.__read_beatmap(cursor)
+
+    def __read_beatmap(self, cursor: _Cursor) -> OSUDbBeatmap:
+        version = self.version
+        if version < _VERSION_NO_ENTRY_SIZE:
+            cursor.skip(4)
+        for _ in range(6):
+            cursor.skip_string()  # Artist, title (both also in Unicode), creator, difficulty name.
+        audio_filename = cursor.string()
+        cursor.skip_string()  # MD5 hash.
+        osu_filename = cursor.string()
+        cursor.skip(1 + 2 * 3)  # Ranked status, hit circle, slider and spinner counts.
+        modified_ticks = cursor.long()
+
+        if version < _VERSION_FLOAT_DIFFICULTY:
+            cursor.skip(4 * 1 + 8)  # AR, CS, HP, OD as bytes, slider velocity.
+        else:
+            cursor.skip(4 * 4 + 8)  # AR, CS, HP, OD as singles, slider velocity.
+            for _ in range(4):  # Star ratings for each mode, by mods.
+                count = cursor.int32()
+                if count:
+                    # Each pair is 0x08 + int mods, then 0x0d + double or (newer) 0x0c + single.
+                    pair_size = 14 if cursor.buffer[cursor.pos + 5] == 0x0d else 10
+                    cursor.skip(count * pair_size)
+        cursor.skip(4 * 3)  # Drain time, total time, preview time.
+        cursor.skip(cursor.int32() * 17)  # Timing points: BPM, offset, uninherited.
+        beatmap_id = cursor.int32()
+        beatmapset_id = cursor.int32()
+        cursor.skip(4 + 4 + 2 + 4)  # Thread ID, grades, local offset, stack leniency.
+        mode = cursor.byte()
+        cursor.skip_string()  # Source.
+        cursor.skip_string()  # Tags.
+        cursor.skip(2)  # Online offset.
+        cursor.skip_string()  # Title font.
+        unplayed = cursor.byte()
+        last_played_ticks = cursor.long()
+        cursor.skip(1)  # osz2.
+        folder_name = cursor.string()
+        cursor.skip(8 + 5)  # Last online check, ignore sound/skin, disable storyboard/video, visual override.
+        if version < _VERSION_FLOAT_DIFFICULTY:
+            cursor.skip(2)
+        cursor.skip(4 + 1)  # Last modification time (again), mania scroll speed.
+
+        return OSUDbBeatmap(
+            folder_name,
+            osu_filename,
+            audio_filename,
+            OSUGameModes(mode),
+            beatmap_id if beatmap_id > 0 else None,
+            beatmapset_id if beatmapset_id > 0 else None,
+            (modified_ticks - _TICKS_AT_EPOCH) * 100,
+            None if unplayed or last_played_ticks <= _TICKS_AT_EPOCH else (last_played_ticks - _TICKS_AT_EPOCH) * 100
+        )
+
+
+class OSUDbIndex:
+    """
+    The game modes of the difficulties in `osu!.db`, by folder and file name,
+    to skip parsing difficulties that are going to be deleted anyway.
+
+    osu! only updates its database when it notices a change, so an entry is
+    only trusted while the .osu file's mtime still matches the one recorded.
+    The recorded time may be in UTC or in local time, so both are accepted.
+    """
+    _modes: dict[str, dict[str, tuple[OSUGameModes, int]]]
+    _utc_offset_ns: int
+
+    def __init__(self, modes: dict[str, dict[str, tuple[OSUGameModes, int]]]):
+        self._modes = modes
+        self._utc_offset_ns = time.localtime().tm_gmtoff * 1_000_000_000
+
+    def __len__(self) -> int:
+        return sum(len(files) for files in self._modes.values())
+
+    @classmethod
+    def load(cls, path: Path, only_modes: list[OSUGameModes] | None = None) -> "OSUDbIndex":
+        """
+        Reads `osu!.db`. With `only_modes`, only difficulties of those modes are
+        kept in memory: the cleaner only ever needs to know which ones to delete.
+        """
+        wanted = set(only_modes) if only_modes is not None else set(OSUGameModes)
+        modes: dict[str, dict[str, tuple[OSUGameModes, int]]] = {}
+        with OSUDatabase(path) as database:
+            for beatmap in database:
+                if beatmap.mode in wanted:
+                    folder = modes.setdefault(beatmap.folder_name.lower(), {})
+                    folder[beatmap.osu_filename.lower()] = (beatmap.mode, beatmap.modified_ns)
+        return cls(modes)
+
+    def mode_of(self, folder_name: str, file: InventoryFile) -> OSUGameModes | None:
+        """The mode osu! recorded for a difficulty, or `None` if it's missing or out of date."""
+        entry = self._modes.get(folder_name.lower(), {}).get(file.rel_path.lower())
+        if entry is None:
+            return None
+        mode, modified_ns = entry
+        difference = file.mtime_ns - modified_ns
+        if abs(difference) <= _MTIME_TOLERANCE_NS or abs(difference + self._utc_offset_ns) <= _MTIME_TOLERANCE_NS:
+            return mode
+        return None
+
+
+def last_played_by_folder(path: Path) -> dict[str, int]:
+    """
+    When any difficulty of each beatmap folder was last played, according to
+    `osu!.db`, in nanoseconds since the Unix epoch, by lowercase folder name.
+    Folders none of whose difficulties were ever played are left out.
+    """
+    last_played: dict[str, int] = {}
+    with OSUDatabase(path) as database:
+        for beatmap in database:
+            if beatmap.last_played_ns is None:
+                continue
+            folder = beatmap.folder_name.lower()
+            if beatmap.last_played_ns > last_played.get(folder, 0):
+                last_played[folder] = beatmap.last_played_ns
+    return last_played
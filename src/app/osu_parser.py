@@ -2,18 +2,33 @@ import os
 import re
 from dataclasses import dataclass
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 from ..exceptions import OSUParsingError
+from .folder_inventory import FolderInventory, InventoryFile
 from .types import OSUGameModes
 
+if TYPE_CHECKING:
+    from .metadata_cache import MetadataCache
+    from .osu_db import OSUDbIndex
+
+# Files are parsed as raw bytes: every marker we look for is plain ASCII, so only
+# the captured filenames ever need to be decoded.
+
 # This regex is designed to find background image declarations in the [Events] section.
 # It now correctly captures file paths that may contain forward slashes (subdirectories).
 # Example: 0,0,"sb/bg.jpg",0,0
-_IMG_LINE_REGEX = re.compile(r'^\d+,\d+,\"(.+?\.(?:jpe?g|png))\"', re.IGNORECASE)
+_IMG_LINE_REGEX = re.compile(rb'^\d+,\d+,\"(.+?\.(?:jpe?g|png))\"', re.IGNORECASE)
 
 # This regex finds video declarations in the [Events] section, also handling subdirectories.
 # Example: Video,1000,"videos/intro.mp4"
-_VIDEO_LINE_REGEX = re.compile(r'^Video,\d*,.?\"(.+?\.(?:avi|mp4|flv))\"', re.IGNORECASE)
+_VIDEO_LINE_REGEX = re.compile(rb'^Video,\d*,.?\"(.+?\.(?:avi|mp4|flv))\"', re.IGNORECASE)
+
+# The sections that hold everything we extract: `AudioFilename` and `Mode` live in
+# [General], `BeatmapID` and `BeatmapSetID` in [Metadata], backgrounds and videos in
+# [Events]. All of them come before [TimingPoints] and [HitObjects], which usually
+# make up the bulk of the file, so parsing stops as soon as they have been read.
+_NEEDED_SECTIONS = frozenset({b"[General]", b"[Metadata]", b"[Events]"})
 
 
 @dataclass
@@ -30,6 +45,10 @@ class OSUFile:
     """A set of all lowercase video filenames referenced in the file."""
     mode: OSUGameModes
     """The game mode of this specific difficulty."""
+    beatmap_id: int | None
+    """The online ID of the difficulty, or `None` for unsubmitted and old (pre-v10) maps."""
+    beatmapset_id: int | None
+    """The online ID of the mapset, or `None` for unsubmitted and old (pre-v10) maps."""
 
 
 @dataclass
@@ -52,7 +71,7 @@ class OSUParser:
     """A static class that handles parsing of .osu files and folders."""
 
     # Beatmaps can have a variety of encodings. This list provides a fallback mechanism.
-    # It attempts to read files with the most common encodings first.
+    # It attempts to decode filenames with the most common encodings first.
     possible_encodings = [
         "UTF-8",
         "iso-8859-5",  # Covers Windows-1251 (Cyrillic)
@@ -60,42 +79,91 @@ class OSUParser:
     ]
 
     @staticmethod
-    def parse_file(file_path: Path, encoding_num: int = 0) -> OSUFile:
+    def _decode(raw: bytes, encodings: list[str]) -> str:
+        """
+        Decodes a captured field with the first encoding in `encodings` that works.
+
+        A fallback encoding that succeeded is moved up to right after the first
+        entry, so when the same list is shared by all difficulties of a folder,
+        sibling files try the encoding that already worked first. The first entry
+        (UTF-8) always stays in place: it is the only one that can reject invalid
+        input, while single-byte codecs decode anything and would hide it.
+        """
+        error: UnicodeDecodeError | None = None
+        for index, encoding in enumerate(encodings):
+            try:
+                text = raw.decode(encoding)
+            except UnicodeDecodeError as e:
+                error = e
+                continue
+            if index > 1:
+                encodings.insert(1, encodings.pop(index))
+            return text
+        raise error or UnicodeDecodeError("unknown", raw, 0, len(raw), "no encodings to try")
+
+    @staticmethod
+    def parse_file(file_path: Path, encodings: list[str] | None = None) -> OSUFile:
         """
         Parses a single .osu file to extract key information.
 
-        If a file cannot be read with one encoding, it recursively tries the next
-        one in the `possible_encodings` list. This handles legacy beatmaps saved
-        with different character sets.
+        Only the [General] (audio file and mode), [Metadata] (`BeatmapID` and
+        `BeatmapSetID`) and [Events] (background and video) sections are looked
+        at, and reading stops once all three are over, so the (often huge)
+        [TimingPoints] and [HitObjects] sections are never read.
+
+        The file is read once, as raw bytes. Only the captured filenames are
+        decoded, trying each of `encodings` (by default `possible_encodings`) in
+        turn. This handles legacy beatmaps saved with different character sets
+        without re-reading the file for every encoding.
         """
+        if encodings is None:
+            encodings = list(OSUParser.possible_encodings)
+
         audio_filename: str = ""
         image_filenames: set[str] = set()
         video_filenames: set[str] = set()
         mode: OSUGameModes = OSUGameModes.OSU
+        beatmap_id: int | None = None
+        beatmapset_id: int | None = None
+
+        section: bytes | None = None
+        sections_left = set(_NEEDED_SECTIONS)
+
+        def decode_path(raw: bytes) -> str:
+            return os.path.normpath(OSUParser._decode(raw, encodings)).lower()
 
         try:
-            encoding = OSUParser.possible_encodings[encoding_num]
-            with open(file_path, 'r', encoding=encoding) as file:
+            with open(file_path, 'rb') as file:
                 for line in file:
                     # Performance: strip and check for comments only once.
                     clean_line = line.strip()
-                    if not clean_line or clean_line.startswith("//"):
+                    if not clean_line or clean_line.startswith(b"//"):
+                        continue
+
+                    # A new section header closes the previous section. Once every
+                    # needed section is closed, the rest of the file is irrelevant.
+                    if clean_line.startswith(b"[") and clean_line.endswith(b"]"):
+                        if section:
+                            sections_left.discard(section)
+                        if not sections_left:
+                            break
+                        section = clean_line
                         continue
 
-                    if line.startswith("AudioFilename: "):
-                        audio_filename = os.path.normpath(line.split(":", 1)[1].strip()).lower()
-                    elif match := _IMG_LINE_REGEX.match(line):
-                        image_filenames.add(os.path.normpath(match.group(1)).lower())
-                    elif match := _VIDEO_LINE_REGEX.match(line):
-                        video_filenames.add(os.path.normpath(match.group(1)).lower())
-                    elif line.startswith("Mode: "):
-                        mode = OSUGameModes(int(line.split(":", 1)[1].strip()))
-        except UnicodeDecodeError as e:
-            # If we haven't exhausted all possible encodings, try the next one.
-            if encoding_num < len(OSUParser.possible_encodings) - 1:
-                return OSUParser.parse_file(file_path, encoding_num + 1)
-            # If all have failed, raise the error.
-            raise e
+                    if section == b"[Events]":
+                        if match := _IMG_LINE_REGEX.match(line):
+                            image_filenames.add(decode_path(match.group(1)))
+                        elif match := _VIDEO_LINE_REGEX.match(line):
+                            video_filenames.add(decode_path(match.group(1)))
+                    elif line.startswith(b"AudioFilename: "):
+                        audio_filename = decode_path(line.split(b":", 1)[1].strip())
+                    elif line.startswith(b"Mode: "):
+                        mode = OSUGameModes(int(line.split(b":", 1)[1].strip()))
+                    elif section == b"[Metadata]" and line.startswith(b"Beatmap"):
+                        if line.startswith(b"BeatmapID:"):
+                            beatmap_id = OSUParser._online_id(line)
+                        elif line.startswith(b"BeatmapSetID:"):
+                            beatmapset_id = OSUParser._online_id(line)
         except Exception as e:
             raise OSUParsingError(e, file_path)
 
@@ -104,31 +172,61 @@ class OSUParser:
             audio_filename,
             image_filenames,
             video_filenames,
-            mode
+            mode,
+            beatmap_id,
+            beatmapset_id
         )
 
+    @staticmethod
+    def _online_id(line: bytes) -> int | None:
+        """Reads an ID field like `BeatmapID:123`. Unsubmitted maps use 0 or -1, which become `None`."""
+        try:
+            value = int(line.split(b":", 1)[1].strip())
+        except ValueError:
+            return None
+        return value if value > 0 else None
+
     @staticmethod
     def parse_folder(
         folder_path: Path,
-        skip_modes: list[OSUGameModes]
+        skip_modes: list[OSUGameModes],
+        inventory: FolderInventory | None = None,
+        cache: "MetadataCache | None" = None,
+        db: "OSUDbIndex | None" = None
     ) -> OSUFilesFolder:
         """
         Parses an entire beatmap folder. It iterates through all .osu files,
         parses each one, and aggregates the results into a single `OSUFilesFolder` object.
+
+        `inventory` can be passed when the folder has already been scanned;
+        otherwise it is scanned here. With a `cache`, difficulties whose size
+        and mtime haven't changed since they were last parsed are not read at all.
+        With a `db` (osu!'s own index), neither are difficulties that it knows
+        to be of a mode marked for deletion.
         
         It filters out difficulties whose game modes are marked for deletion by the user.
         """
+        if inventory is None:
+            inventory = FolderInventory(folder_path)
+
         osu_files: list[OSUFile] = []
         audio_filenames: set[str] = set()
         image_filenames: set[str] = set()
         video_filenames: set[str] = set()
-
-        for file in os.listdir(folder_path):
-            if not file.lower().endswith('.osu'):
+        # Difficulties of one mapset are almost always saved with the same encoding,
+        # so this list is shared between them and reordered as encodings succeed.
+        encodings = list(OSUParser.possible_encodings)
+        parsed: list[tuple[InventoryFile, OSUFile]] = []
+
+        for file in inventory.osu_files:
+            # Deleted difficulties don't keep any file, so their mode is all that matters.
+            if db is not None and db.mode_of(folder_path.name, file) in skip_modes:
                 continue
 
-            file_path = folder_path / file
-            osu_file = OSUParser.parse_file(file_path)
+            osu_file = cache.lookup(folder_path.name, file) if cache else None
+            if osu_file is None:
+                osu_file = OSUParser.parse_file(Path(file.path), encodings)
+            parsed.append((file, osu_file))
             
             # Skip this difficulty if its game mode is in the user's deletion list.
             if osu_file.mode in skip_modes:
@@ -140,6 +238,9 @@ class OSUParser:
             if osu_file.audio_filename:
                 audio_filenames.add(osu_file.audio_filename)
 
+        if cache:
+            cache.update_folder(folder_path.name, parsed)
+
         return OSUFilesFolder(
             osu_files,
             set(f.filename for f in osu_files),
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import TextIO
+
+from .file_utils import atomic_write_text
+from .folder_inventory import FolderInventory
+
+
+class ProcessedIndex:
+    """
+    A persistent record of the beatmap IDs that were already cleaned, each
+    with the `folder_signature` its folder had once it was cleaned.
+
+    IDs are kept in memory in a dict, so lookups are O(1) no matter how large
+    the library is. On disk they are stored in a plain text log
+    (`processed_folders.txt`, one `ID<TAB>signature` per line) that only ever
+    gets appended to, so saving progress costs a few bytes instead of
+    rewriting the whole file; when an ID is logged again with a new signature,
+    the last line wins. The log is compacted with an atomic temp-file + rename
+    whenever it contains a torn line from a crash or repeated IDs, or after
+    "Force Clean" resets it.
+
+    Lines with just an ID, written by older versions, have no signature yet.
+
+    The legacy `processed_folders.json` from older versions is migrated
+    automatically the first time the index is opened.
+    """
+    FILENAME = "processed_folders.txt"
+    LEGACY_FILENAME = "processed_folders.json"
+
+    path: Path
+    _ids: dict[int, str | None]
+    """The signature of every processed ID, or `None` if it isn't known yet."""
+    _log: TextIO | None
+    _needs_compact: bool
+
+    def __init__(self, songs_folder: Path, reset: bool = False):
+        self.path = songs_folder / self.FILENAME
+        self._log = None
+        self._needs_compact = False
+
+        if reset:
+            # "Force Clean": forget everything, the log is rewritten on the first flush.
+            self._ids = {}
+            self._needs_compact = True
+        elif self.path.exists():
+            self._ids = self.__load_log()
+        else:
+            self._ids = self.__migrate_legacy_json(songs_folder / self.LEGACY_FILENAME)
+
+    def __contains__(self, folder_id: object) -> bool:
+        return folder_id in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def signature(self, folder_id: int) -> str | None:
+        """The signature recorded with a processed ID, or `None` if there is none."""
+        return self._ids.get(folder_id)
+
+    def add(self, folder_id: int, signature: str | None = None):
+        """
+        Records `folder_id` as processed, with the signature of its cleaned
+        folder. The write is buffered until `flush`.
+        """
+        if folder_id in self._ids and (signature is None or self._ids[folder_id] == signature):
+            return
+        self._ids[folder_id] = signature
+        if self._needs_compact:
+            return  # The pending compaction will write it anyway.
+        self.__open_log().write(self.__line(folder_id, signature))
+
+    def flush(self):
+        """Makes every ID added so far durable on disk."""
+        if self._needs_compact:
+            self.compact()
+            return
+        if self._log is not None:
+            self._log.flush()
+            os.fsync(self._log.fileno())
+
+    def compact(self):
+        """Atomically rewrites the log so that it contains every ID exactly once."""
+        self.__close_log()
+        atomic_write_text(self.path, "".join(self.__line(i, self._ids[i]) for i in sorted(self._ids)))
+        self._needs_compact = False
+
+    def close(self):
+        """Saves everything and releases the file handle. The index can still be used afterwards."""
+        self.flush()
+        self.__close_log()
+
+    @staticmethod
+    def __line(folder_id: int, signature: str | None) -> str:
+        return f"{folder_id}\n" if signature is None else f"{folder_id}\t{signature}\n"
+
+    def __close_log(self):
+        if self._log is None:
+            return
+        self._log.close()
+        self._log = None
+
+    def __open_log(self) -> TextIO:
+        if self._log is None:
+            self._log = open(self.path, 'a', encoding='utf-8', newline='\n')
+        return self._log
+
+    def __load_log(self) -> dict[int, str | None]:
+        """
+        Reads the log file. A line that can't be parsed (e.g. a partially
+        written last line after a crash) is skipped, and the log is scheduled
+        for compaction so the next append doesn't get glued onto it. So is a
+        log with repeated IDs, to keep it from growing with every re-clean.
+        """
+        with open(self.path, 'r', encoding='utf-8') as log_file:
+            content = log_file.read()
+
+        # Everything after the last newline is an incomplete write.
+        *lines, tail = content.split("\n")
+        if tail:
+            self._needs_compact = True
+
+        ids: dict[int, str | None] = {}
+        for line in lines:
+            folder_id, _, signature = line.partition("\t")
+            try:
+                ids[int(folder_id)] = signature or None
+            except ValueError:
+                self._needs_compact = True
+        if len(ids) < len(lines):
+            self._needs_compact = True
+        return ids
+
+    def __migrate_legacy_json(self, json_path: Path) -> dict[int, str | None]:
+        """
+        Imports IDs from the `processed_folders.json` used by older versions.
+        The new log is written first and the JSON file is only renamed to
+        `.bak` afterwards, so an interrupted migration simply runs again.
+        """
+        if not json_path.exists():
+            return {}
+
+        with open(json_path, 'r', encoding='utf-8') as json_file:
+            ids: dict[int, str | None] = dict.fromkeys((int(i) for i in json.load(json_file)), None)
+
+        self._ids = ids
+        self.compact()
+        os.replace(json_path, json_path.with_name(json_path.name + ".bak"))
+        return ids
+
+
+def folder_signature(folder: Path, inventory: FolderInventory | None = None) -> str | None:
+    """
+    A cheap fingerprint of a beatmap folder, to notice that it changed after
+    it was cleaned: its mtime (files added, removed or renamed) and the names
+    and sizes of its .osu files (a mapset updated or downloaded again over
+    the same files). It takes one `stat` and one `os.scandir`, whose entries
+    come with their sizes on Windows. Given the `inventory` a folder was just
+    cleaned from, its remaining .osu files are taken from there instead, and
+    only the `stat` is left.
+
+    Returns `None` if the folder can't be read.
+    """
+    difficulties: list[tuple[str, int]] = []
+    try:
+        mtime_ns = os.stat(folder).st_mtime_ns
+        if inventory is not None:
+            for file in inventory.osu_files:
+                if not file.is_symlink and not inventory.is_removed(file.rel_path):
+                    difficulties.append((file.rel_path, file.size))
+        else:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if entry.name.lower().endswith(".osu") and entry.is_file(follow_symlinks=False):
+                        difficulties.append((entry.name, entry.stat(follow_symlinks=False).st_size))
+    except OSError:
+        return None
+    digest = hashlib.blake2b(str(mtime_ns).encode(), digest_size=8)
+    for name, size in sorted(difficulties):
+        digest.update(f"\0{name}\0{size}".encode("utf-8", errors="surrogateescape"))
+    return digest.hexdigest()
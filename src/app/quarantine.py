@@ -0,0 +1,118 @@
+import os
+import shutil
+import time
+from pathlib import Path
+from threading import Lock, Thread
+
+# Next to the Songs folder rather than inside it, so osu! never imports
+# quarantined beatmaps back, but still on the same volume in almost every setup.
+QUARANTINE_FOLDER_NAME = "sh(x)cleaner-quarantine"
+
+
+class Quarantine:
+    """
+    A trash area for whole beatmap folders, next to the Songs folder.
+
+    Deleting a folder takes one system call per file, which adds up for large
+    storyboard-heavy sets. Moving it into quarantine is a single rename, no
+    matter its size, so a run ends as soon as every folder has been moved. The
+    folders are actually deleted later: every run starts by purging what
+    earlier runs left in quarantine, on a background thread.
+
+    Each run moves its folders into a batch of its own, named after the time
+    the run started. Until the batch is purged, its folders can be moved back
+    into Songs with `restore`.
+    """
+    songs_folder: Path
+    root: Path
+    batch: Path
+    _batch_created: bool
+    _lock: Lock
+
+    def __init__(self, songs_folder: Path):
+        self.songs_folder = songs_folder
+        self.root = songs_folder.parent / QUARANTINE_FOLDER_NAME
+        self.batch = self.root / time.strftime("%Y%m%d-%H%M%S")
+        self._batch_created = False
+        self._lock = Lock()
+
+    def is_on_same_volume(self) -> bool:
+        """Whether folders can be renamed into quarantine rather than copied."""
+        try:
+            quarantine_volume = os.stat(self.root if self.root.exists() else self.root.parent).st_dev
+            return os.stat(self.songs_folder).st_dev == quarantine_volume
+        except OSError:
+            return False
+
+    def move(self, folder: Path) -> Path:
+        """Moves a beatmap folder into this run's batch and returns its new path."""
+        with self._lock:
+            if not self._batch_created:
+                self.batch.mkdir(parents=True, exist_ok=True)
+                self._batch_created = True
+            target = self.batch / folder.name
+            # A folder of the same name can only be here if it was restored and removed again.
+            suffix = 1
+            while target.exists():
+                suffix += 1
+                target = self.batch / f"{folder.name} ({suffix})"
+            os.rename(folder, target)
+        return target
+
+    def batches(self) -> list[Path]:
+        """The batches still in quarantine, oldest first."""
+        if not self.root.is_dir():
+            return []
+        return sorted(p for p in self.root.iterdir() if p.is_dir())
+
+    def contents(self) -> dict[str, list[str]]:
+        """The names of the quarantined folders, by batch."""
+        return {batch.name: sorted(p.name for p in batch.iterdir()) for batch in self.batches()}
+
+    def restore(self, name: str) -> Path:
+        """
+        Moves a quarantined folder back into Songs, from the newest batch that
+        has it. Raises `FileNotFoundError` if no batch has it and
+        `FileExistsError` if Songs already has a folder of that name.
+        """
+        for batch in reversed(self.batches()):
+            source = batch / name
+            if not source.exists():
+                continue
+            target = self.songs_folder / name
+            if target.exists():
+                raise FileExistsError(f"{target} already exists")
+            os.rename(source, target)
+            try:
+                batch.rmdir()  # Only succeeds once the batch is empty.
+            except OSError:
+                pass
+            return target
+        raise FileNotFoundError(f"{name} is not in quarantine")
+
+    def purge(self):
+        """Deletes every batch except the one of this run."""
+        for batch in self.batches():
+            if batch == self.batch:
+                continue
+            try:
+                shutil.rmtree(batch)
+            except OSError as e:
+                # Whatever is left will be purged by the next run.
+                print(f"Could not purge {batch}: {e}")
+        with self._lock:  # Not while `move` is creating this run's batch.
+            try:
+                self.root.rmdir()
+            except OSError:
+                pass
+
+    def purge_in_background(self) -> Thread | None:
+        """
+        Starts `purge` on a thread, if there is anything to purge. The thread
+        isn't a daemon, so the process waits for the purge before it exits.
+        """
+        if not any(batch != self.batch for batch in self.batches()):
+            return None
+        thread = Thread(target=self.purge, name="quarantine-purge")
+        thread.start()
+        return thread
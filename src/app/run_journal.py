@@ -0,0 +1,133 @@
+import json
+from pathlib import Path
+from threading import Lock
+from typing import TextIO
+
+from .clean_plan import CleanAction, FolderPlan
+from .file_utils import atomic_write_text
+
+
+class RunJournal:
+    """
+    A write-ahead log of the folder plans of a run (`clean_journal.jsonl` in
+    the Songs folder), so a run that is closed, crashes or stops on an error
+    can be resumed where it stopped.
+
+    Before a plan is executed, a `begin` record with all its actions is
+    appended; once the folder is finished, a `done` record follows, with the
+    folder's ID and signature if it has to be saved as processed. Records are flushed to the
+    OS as they are written, so they survive the app being closed or crashing.
+
+    Every checkpoint, once the processed index is durable, the journal is
+    atomically rewritten (temp file + rename) with only the unfinished plans,
+    so it stays small. A completed run deletes it.
+
+    The next run reads what is left with `recover`: the IDs of finished
+    folders go into the processed index, so they aren't parsed again, and the
+    unfinished plans are replayed, skipping the actions that were already done.
+    """
+    FILENAME = "clean_journal.jsonl"
+
+    path: Path
+    _file: TextIO | None
+    _next_entry: int
+    _unfinished: dict[int, str]
+    """The `begin` records of plans that aren't done yet, by entry number."""
+    _lock: Lock
+
+    def __init__(self, songs_folder: Path):
+        self.path = songs_folder / self.FILENAME
+        self._file = None
+        self._next_entry = 0
+        self._unfinished = {}
+        self._lock = Lock()
+
+    def recover(self, songs_folder: Path) -> tuple[list[FolderPlan], list[tuple[int, str | None]]]:
+        """
+        Reads the journal of an interrupted run. Returns the plans that were
+        begun but not finished, in the order they were begun, and the IDs and
+        signatures of the finished folders that have to be saved as processed.
+        """
+        if not self.path.exists():
+            return [], []
+        with open(self.path, 'r', encoding='utf-8') as journal_file:
+            lines = journal_file.read().split("\n")
+
+        begun: dict[int, FolderPlan] = {}
+        processed_ids: list[tuple[int, str | None]] = []
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Empty, or torn by a crash in the middle of a write.
+            if "begin" in record:
+                begun[record["begin"]] = FolderPlan(
+                    songs_folder / record["folder"],
+                    [CleanAction.from_json(action) for action in record["actions"]],
+                    record["keeps_folder"]
+                )
+            elif "done" in record:
+                begun.pop(record["done"], None)
+                if record.get("id") is not None:
+                    processed_ids.append((record["id"], record.get("signature")))
+        return list(begun.values()), processed_ids
+
+    def begin(self, plan: FolderPlan) -> int | None:
+        """
+        Logs a plan before it is executed and returns its entry number for
+        `done`. Plans that change nothing aren't logged and get `None`.
+        """
+        if not plan.actions:
+            return None
+        with self._lock:
+            entry = self._next_entry
+            self._next_entry += 1
+            record = json.dumps({
+                "begin": entry,
+                "folder": plan.folder.name,
+                "keeps_folder": plan.keeps_folder,
+                "actions": [action.to_json() for action in plan.actions],
+            }, ensure_ascii=False)
+            self._unfinished[entry] = record
+            self.__write(record)
+        return entry
+
+    def done(self, entry: int | None, processed_id: int | None = None, signature: str | None = None):
+        """
+        Logs that a plan was executed and, with `processed_id`, that its
+        folder's ID is processed, with the folder's `signature`.
+        """
+        if entry is None and processed_id is None:
+            return
+        with self._lock:
+            if entry is not None:
+                self._unfinished.pop(entry, None)
+            self.__write(json.dumps({"done": entry, "id": processed_id, "signature": signature}))
+
+    def checkpoint(self):
+        """
+        Atomically rewrites the journal with only the unfinished plans. Must
+        only be called once every ID logged so far is durable in the index.
+        """
+        with self._lock:
+            self.__close_file()
+            atomic_write_text(self.path, "".join(f"{record}\n" for record in self._unfinished.values()))
+
+    def close(self):
+        """Ends a completed run, deleting the journal."""
+        with self._lock:
+            self.__close_file()
+            self._unfinished.clear()
+            self.path.unlink(missing_ok=True)
+
+    def __write(self, record: str):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8', newline='\n')
+        self._file.write(record + "\n")
+        self._file.flush()
+
+    def __close_file(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
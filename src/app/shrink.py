@@ -0,0 +1,224 @@
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+
+from .clean_plan import ActionKind, CleanAction, FolderPlan
+from .dedupe import hash_file, try_hash_file
+from .folder_inventory import InventoryFile
+
+# The defaults of "Shrink": 1080p is what osu! shows on most screens.
+DEFAULT_MAX_SIZE = (1920, 1080)
+DEFAULT_QUALITY = 85
+# Backgrounds smaller than this are already cheap to load and aren't worth reading.
+MIN_SHRINK_SIZE = 256 * 1024
+# A re-encoding only replaces the original if it is at least this much smaller.
+MIN_SAVING = 0.1
+# Next to the background, until the plan replacing it is executed.
+SHRINK_SUFFIX = ".shx-shrink"
+
+
+def is_qt_available() -> bool:
+    """Whether Qt's image support, which `shrink_image` needs, can be loaded."""
+    try:
+        from PyQt6 import QtGui  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def shrink_image(path: str, outputs: list[str], max_size: tuple[int, int], quality: int) -> tuple[int, str] | None:
+    """
+    Downscales an image to fit into `max_size` and re-encodes it in the format
+    its extension names: JPEG at `quality`, PNG losslessly at maximum
+    compression. The result is written to every path in `outputs`.
+
+    Runs in a worker process. Returns the size and digest of the result, or
+    `None` if the image can't be read or the result isn't `MIN_SAVING` smaller.
+    """
+    # Imported here, so only the worker processes load Qt's image plugins.
+    from PyQt6.QtCore import QBuffer, QByteArray, QIODevice, Qt
+    from PyQt6.QtGui import QImageReader
+
+    reader = QImageReader(path)
+    reader.setAutoTransform(True)
+    image = reader.read()
+    if image.isNull():
+        return None
+    max_width, max_height = max_size
+    if image.width() > max_width or image.height() > max_height:
+        image = image.scaled(
+            max_width, max_height,
+            Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation
+        )
+
+    is_png = path.lower().endswith(".png")
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    if not image.save(buffer, "PNG" if is_png else "JPG", 0 if is_png else quality):
+        return None
+    encoded = data.data()
+    if len(encoded) > os.path.getsize(path) * (1 - MIN_SAVING):
+        return None
+
+    for output in outputs:
+        with open(output, 'wb') as output_file:
+            output_file.write(encoded)
+    digest = hash_file(outputs[0]) if outputs else None
+    return len(encoded), digest or ""
+
+
+class BackgroundShrinker:
+    """
+    "Shrink" mode: keeps each mapset's own backgrounds, but downscales them to
+    at most `max_size` and re-encodes them at `quality`, under the same name.
+    Many backgrounds are multi-MB 4K PNGs, which cost disk space and make
+    osu!'s song select slow to load them.
+
+    As with `BackgroundStore`, the kept backgrounds of every cleaned folder are
+    registered with `add`, and once all folders are done `plan` shrinks them:
+    decoding and encoding run in a process pool, since they are CPU-bound and
+    hold the GIL. Each result is written next to its background first, and the
+    returned plans (`SHRINK`) move it over the original, so a background is
+    never left half-written. Until then the results are listed in
+    `shrink_pending.txt`, so results whose plans were never applied (the pass
+    failed, or the run was interrupted) are deleted by `remove_pending_outputs`.
+
+    Backgrounds are identified by their content hash, kept in
+    `shrunk_backgrounds.txt` in the Songs folder, one per line: the results of
+    shrinking and the images that weren't worth it. Those are skipped by later
+    runs, and an image that several folders share is only shrunk once.
+    """
+    FILENAME = "shrunk_backgrounds.txt"
+    PENDING_FILENAME = "shrink_pending.txt"
+
+    path: Path
+    pending_path: Path
+    max_size: tuple[int, int]
+    quality: int
+    workers: int
+    _done: set[str]
+    """Digests of images that need no shrinking: results, and images it didn't pay off for."""
+    _new: list[str]
+    _candidates: list[tuple[Path, InventoryFile]]
+
+    def __init__(
+        self,
+        songs_folder: Path,
+        max_size: tuple[int, int] = DEFAULT_MAX_SIZE,
+        quality: int = DEFAULT_QUALITY,
+        workers: int | None = None
+    ):
+        # Checked once here, instead of failing for every image in the workers.
+        if not is_qt_available():
+            raise ImportError("Shrinking backgrounds needs PyQt6, install it with `pip install PyQt6`.")
+        self.path = songs_folder / self.FILENAME
+        self.pending_path = songs_folder / self.PENDING_FILENAME
+        self.max_size = max_size
+        self.quality = quality
+        self.workers = workers or os.cpu_count() or 1
+        self._new = []
+        self._candidates = []
+        self._done = set()
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as done_file:
+                self._done = {line for line in done_file.read().split("\n") if line}
+
+    def add(self, folder: Path, images: list[InventoryFile]):
+        """Registers the kept background images of a cleaned folder."""
+        self._candidates.extend((folder, image) for image in images if image.size >= MIN_SHRINK_SIZE)
+
+    def discard(self, folder: Path):
+        """Forgets the images of a folder, e.g. because the folder was deleted."""
+        self._candidates = [c for c in self._candidates if c[0] != folder]
+
+    def plan(self, pool: Executor | None = None, dry_run: bool = False) -> list[FolderPlan]:
+        """
+        Shrinks the registered images and plans to replace them. Files are
+        hashed on `pool`, if given. In a dry run nothing is written, the
+        images are only encoded to know how much would be saved.
+        """
+        paths = [image.path for _, image in self._candidates]
+        digests = pool.map(try_hash_file, paths) if pool is not None else map(try_hash_file, paths)
+        by_digest: dict[str, list[tuple[Path, InventoryFile]]] = {}
+        for candidate, digest in zip(self._candidates, digests):
+            if digest is not None and digest not in self._done:
+                by_digest.setdefault(digest, []).append(candidate)
+        self._candidates = []
+        if not by_digest:
+            return []
+
+        if not dry_run:
+            # Listed before they are written, so they can't be left behind unnoticed.
+            with open(self.pending_path, 'a', encoding='utf-8', newline='\n') as pending_file:
+                pending_file.write("".join(
+                    f"{image.path}{SHRINK_SUFFIX}\n" for copies in by_digest.values() for _, image in copies
+                ))
+
+        plans: list[FolderPlan] = []
+        # Spawned rather than forked everywhere: the parent process runs threads (and Qt).
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(min(self.workers, len(by_digest)), mp_context=context) as processes:
+            futures = {
+                digest: processes.submit(
+                    shrink_image, copies[0][1].path,
+                    [] if dry_run else [image.path + SHRINK_SUFFIX for _, image in copies],
+                    self.max_size, self.quality
+                )
+                for digest, copies in by_digest.items()
+            }
+            for digest, future in futures.items():
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Could not shrink {by_digest[digest][0][1].path}: {e}")
+                    continue
+                if result is None:
+                    self.__mark_done(digest)
+                    continue
+                size, result_digest = result
+                self.__mark_done(result_digest)
+                for folder, image in by_digest[digest]:
+                    plans.append(FolderPlan(folder, [CleanAction(
+                        ActionKind.SHRINK, image.path, image.size - size, target=image.path + SHRINK_SUFFIX
+                    )], True))
+        return plans
+
+    @classmethod
+    def remove_pending_outputs(cls, songs_folder: Path):
+        """
+        Deletes the results written by `plan` that weren't moved into place,
+        then the list of them. Doesn't need Qt, so any run can clean up after
+        an interrupted "Shrink" run.
+        """
+        pending_path = songs_folder / cls.PENDING_FILENAME
+        try:
+            with open(pending_path, 'r', encoding='utf-8') as pending_file:
+                outputs = [line for line in pending_file.read().split("\n") if line]
+        except FileNotFoundError:
+            return
+        removed_all = True
+        for output in outputs:
+            try:
+                os.remove(output)
+            except FileNotFoundError:
+                pass  # Moved over its original by a plan.
+            except OSError as e:
+                print(f"Could not remove {output}: {e}")
+                removed_all = False
+        if removed_all:
+            pending_path.unlink(missing_ok=True)
+
+    def save(self):
+        """Appends the digests learned in this run."""
+        if not self._new:
+            return
+        with open(self.path, 'a', encoding='utf-8', newline='\n') as done_file:
+            done_file.write("".join(f"{digest}\n" for digest in self._new))
+        self._new = []
+
+    def __mark_done(self, digest: str):
+        if digest and digest not in self._done:
+            self._done.add(digest)
+            self._new.append(digest)
@@ -1,6 +1,6 @@
 from enum import Enum
 from pathlib import Path
-from typing import TypedDict
+from typing import NotRequired, TypedDict
 
 
 class OSUGameModes(Enum):
@@ -19,3 +19,15 @@ class CleanerParams(TypedDict):
     keep_videos: bool
     ignore_id_limit: bool
     dangerous_clean_no_id: bool
+    # The remaining options may be left out; missing ones fall back to their defaults.
+    workers: NotRequired[int]
+    dedupe_backgrounds: NotRequired[bool]
+    shrink_backgrounds: NotRequired[bool]
+    shrink_max_size: NotRequired[tuple[int, int]]
+    shrink_quality: NotRequired[int]
+    dedupe_mapsets: NotRequired[bool]
+    dedupe_media: NotRequired[bool]
+    profile: NotRequired[bool]
+    quarantine: NotRequired[bool]
+    use_osu_db: NotRequired[bool]
+    dry_run: NotRequired[bool]
@@ -1,6 +1,8 @@
+import json
 import re
-
-import requests
+import tempfile
+import time
+from pathlib import Path
 
 CURRENT_VERSION = "3.0"
 
@@ -8,15 +10,42 @@ REPO = "shsh-x/sh-x-cleaner"
 REPO_API_URL = f"https://api.github.com/repos/{REPO}/releases/latest"
 REPO_RELEASE_URL = f"https://github.com/{REPO}/releases/latest"
 
+# The latest release tag is cached on disk, so most launches make no network call.
+UPDATE_CACHE_PATH = Path(tempfile.gettempdir()) / "sh(x)cleaner_update_check.json"
+UPDATE_CACHE_TTL = 24 * 60 * 60
+REQUEST_TIMEOUT = 5
+
 
 def __get_latest_release_tag() -> str:
-    api_url = f"https://api.github.com/repos/{REPO}/releases/latest"
-    response = requests.get(api_url)
+    # Imported here so that starting the app doesn't pay for loading `requests`.
+    import requests
+
+    response = requests.get(REPO_API_URL, timeout=REQUEST_TIMEOUT)
     response.raise_for_status()
 
     return response.json()['tag_name']
 
 
+def __get_cached_release_tag() -> str | None:
+    """Returns the cached release tag if it is younger than `UPDATE_CACHE_TTL`."""
+    try:
+        with open(UPDATE_CACHE_PATH, 'r', encoding='utf-8') as cache_file:
+            cache = json.load(cache_file)
+        if 0 <= time.time() - cache['checked_at'] < UPDATE_CACHE_TTL:
+            return cache['tag_name']
+    except Exception:
+        pass
+    return None
+
+
+def __cache_release_tag(tag_name: str):
+    try:
+        with open(UPDATE_CACHE_PATH, 'w', encoding='utf-8') as cache_file:
+            json.dump({"checked_at": time.time(), "tag_name": tag_name}, cache_file)
+    except OSError:
+        pass  # Not being able to cache only means checking again next time.
+
+
 def __parse_version(ver: str) -> tuple:
     ver = re.sub(r'^[vV\.]+', '', ver)
     return tuple(map(int, re.split(r'[^\d]+', ver)))
@@ -29,8 +58,15 @@ def __is_new_version(version: str) -> bool:
 
 
 def check_for_updates() -> tuple[bool, str]:
+    """
+    Checks GitHub for a newer release. This may block for up to
+    `REQUEST_TIMEOUT` seconds, so it shouldn't be called on the GUI thread.
+    """
     try:
-        latest_version = __get_latest_release_tag()
+        latest_version = __get_cached_release_tag()
+        if latest_version is None:
+            latest_version = __get_latest_release_tag()
+            __cache_release_tag(latest_version)
         return __is_new_version(latest_version), latest_version
     except Exception:
         return False, ""
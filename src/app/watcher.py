@@ -0,0 +1,246 @@
+import os
+import stat
+import time
+from pathlib import Path
+from threading import Event, Lock
+from typing import Callable
+
+from ..exceptions import CleanError, OSUParsingError
+from .cleaner import RESERVED_FOLDER_NAMES, Cleaner
+from .progress import ProgressSnapshot
+from .quarantine import Quarantine
+from .types import CleanerParams
+
+
+class SongsWatcher:
+    """
+    Watch mode: keeps cleaning the beatmap folders that appear or change in
+    the Songs folder, e.g. while maps are being imported, without going over
+    the whole library every time.
+
+    Changes are found by polling, which costs almost nothing while idle: the
+    Songs folder itself is stat'ed every `poll_interval` seconds, and it is only
+    listed when its mtime changes (a folder was added, removed or renamed).
+    Changes inside existing folders don't touch that mtime, so the folders are
+    also compared every `rescan_interval` seconds. With the optional `watchdog`
+    package installed, the OS reports changes instead (inotify,
+    ReadDirectoryChangesW, FSEvents) and only the reported folders are checked.
+
+    A new or changed folder is cleaned once it hasn't changed for
+    `settle_delay` seconds, so osu! can finish extracting it. All folders that
+    are ready at the same time are cleaned as one batch by a regular `Cleaner`,
+    with the usual processed-index and duplicate logic, so `force_clean` is
+    refused. With `quarantine`, every batch moves its folders into the same
+    quarantine batch, which is only purged by a later run or watch session.
+    Folders that are already there when watching starts are left to a normal
+    run.
+    """
+    songs_folder: Path
+    params: CleanerParams
+    on_progress: Callable[[ProgressSnapshot], None]
+    on_batch: Callable[[Cleaner, list[Path]], None] | None
+    settle_delay: float
+    poll_interval: float
+    rescan_interval: float
+    _known: dict[str, int]
+    """The mtime of every beatmap folder that has been seen, by name."""
+    _pending: dict[str, tuple[int, float]]
+    """Folders waiting to settle: their mtime and when it was last seen changing."""
+    _touched: set[str]
+    """Folders reported by OS notifications since they were last checked."""
+    _songs_mtime: int
+    _quarantine: Quarantine
+    """Shared by every batch, so that a batch doesn't purge the folders the previous ones quarantined."""
+    _wakeup: Event
+    _lock: Lock
+
+    def __init__(
+        self,
+        songs_folder: Path,
+        params: CleanerParams,
+        on_progress: Callable[[ProgressSnapshot], None],
+        on_batch: Callable[[Cleaner, list[Path]], None] | None = None,
+        settle_delay: float = 10.0,
+        poll_interval: float = 2.0,
+        rescan_interval: float = 60.0
+    ):
+        if params.get('force_clean', False):
+            raise ValueError("Watch mode can't force clean: each batch would reset the processed folders to itself.")
+        self.songs_folder = songs_folder
+        self.params = params
+        self.on_progress = on_progress
+        self.on_batch = on_batch
+        self.settle_delay = settle_delay
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval
+        self._known = {}
+        self._pending = {}
+        self._touched = set()
+        self._songs_mtime = 0
+        self._quarantine = Quarantine(songs_folder)
+        self._wakeup = Event()
+        self._lock = Lock()
+
+    def run(self, stop: Event):
+        """Watches and cleans until `stop` is set."""
+        # What earlier runs quarantined is purged once, when watching starts.
+        self._quarantine.purge_in_background()
+        observer = self.__start_observer()
+        self.__songs_folder_changed()
+        self._known = self.__scan()
+        last_rescan = time.monotonic()
+        try:
+            while not stop.is_set():
+                self._wakeup.wait(self.__next_timeout())
+                self._wakeup.clear()
+                if stop.is_set():
+                    break
+                now = time.monotonic()
+
+                with self._lock:
+                    touched, self._touched = self._touched, set()
+                if now - last_rescan >= self.rescan_interval:
+                    self.__detect(self.__scan(), now)
+                    last_rescan = now
+                elif observer is None:
+                    if self.__songs_folder_changed():
+                        self.__detect(self.__scan(), now)
+                else:
+                    self.__detect(self.__stat_folders(touched), now, touched)
+
+                ready = self.__settled(now)
+                if ready:
+                    self.__clean_batch(ready)
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+    def __start_observer(self):
+        """Subscribes to OS notifications if `watchdog` is installed, or returns `None` to poll."""
+        try:
+            from watchdog.events import FileSystemEventHandler  # type: ignore[import-not-found]
+            from watchdog.observers import Observer  # type: ignore[import-not-found]
+        except ImportError:
+            return None
+
+        notify = self.__on_notification
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                for path in (event.src_path, getattr(event, "dest_path", "")):
+                    notify(os.fsdecode(path))
+
+        observer = Observer()
+        observer.schedule(_Handler(), str(self.songs_folder), recursive=True)
+        observer.start()
+        return observer
+
+    def __on_notification(self, path: str):
+        """Called on the observer's thread: remembers which beatmap folder changed."""
+        if not path:
+            return
+        relative = os.path.relpath(path, self.songs_folder)
+        name = relative.split(os.sep, 1)[0]
+        # Files directly in Songs (the cleaner's own index, cache and reports) are not beatmaps.
+        if name in (".", "..") or os.sep not in relative and not os.path.isdir(path):
+            return
+        with self._lock:
+            self._touched.add(name)
+        self._wakeup.set()
+
+    def __next_timeout(self) -> float:
+        """Sleeps until the next poll, or until the first pending folder could be ready."""
+        if not self._pending:
+            return self.poll_interval
+        first_change = min(changed_at for _, changed_at in self._pending.values())
+        until_settled = first_change + self.settle_delay - time.monotonic()
+        return max(0.05, min(self.poll_interval, until_settled))
+
+    def __songs_folder_changed(self) -> bool:
+        try:
+            mtime = os.stat(self.songs_folder).st_mtime_ns
+        except OSError:
+            return False
+        changed = mtime != self._songs_mtime
+        self._songs_mtime = mtime
+        return changed
+
+    def __scan(self) -> dict[str, int]:
+        """The mtime of every beatmap folder in Songs, by name."""
+        folders: dict[str, int] = {}
+        with os.scandir(self.songs_folder) as it:
+            for entry in it:
+                if entry.name in RESERVED_FOLDER_NAMES:
+                    continue
+                try:
+                    if entry.is_dir():
+                        folders[entry.name] = entry.stat().st_mtime_ns
+                except OSError:
+                    pass  # Removed while being listed.
+        return folders
+
+    def __stat_folders(self, names: set[str]) -> dict[str, int]:
+        """The mtime of the given folders, leaving out those that don't exist (anymore)."""
+        folders: dict[str, int] = {}
+        for name in names:
+            if name in RESERVED_FOLDER_NAMES:
+                continue
+            try:
+                folder_stat = os.stat(self.songs_folder / name)
+            except OSError:
+                continue
+            if stat.S_ISDIR(folder_stat.st_mode):
+                folders[name] = folder_stat.st_mtime_ns
+        return folders
+
+    def __detect(self, folders: dict[str, int], now: float, checked: set[str] | None = None):
+        """
+        Compares folders with what was seen before and marks the new and changed
+        ones as pending. `checked` limits the comparison to those names; without
+        it `folders` is the whole Songs folder, so missing folders were removed.
+        """
+        for name, mtime in folders.items():
+            if self._known.get(name) != mtime or (checked is not None and name in self._pending):
+                # Notified or changed: (re)start its settling delay.
+                self._pending[name] = (mtime, now)
+            self._known[name] = mtime
+        removed = (checked if checked is not None else set(self._known)) - folders.keys()
+        for name in removed:
+            self._known.pop(name, None)
+            self._pending.pop(name, None)
+
+    def __settled(self, now: float) -> list[Path]:
+        """Pending folders that haven't changed for `settle_delay` seconds."""
+        ready: list[Path] = []
+        for name, (mtime, changed_at) in list(self._pending.items()):
+            folder = self.songs_folder / name
+            try:
+                current = os.stat(folder).st_mtime_ns
+            except OSError:
+                del self._pending[name]
+                self._known.pop(name, None)
+                continue
+            if current != mtime:
+                self._pending[name] = (current, now)
+                self._known[name] = current
+            elif now - changed_at >= self.settle_delay:
+                del self._pending[name]
+                ready.append(folder)
+        return sorted(ready)
+
+    def __clean_batch(self, folders: list[Path]):
+        """Cleans the settled folders. An error is reported, but doesn't stop watching."""
+        cleaner = Cleaner(self.songs_folder, self.params, self.on_progress, self._quarantine)
+        try:
+            cleaner.start_clean(folders)
+        except (CleanError, OSUParsingError) as e:
+            print(f"An error occurred, watching goes on:\n{e}")
+        # The cleaner changed these folders itself; only later changes count.
+        for name, mtime in self.__stat_folders({f.name for f in folders}).items():
+            self._known[name] = mtime
+        for folder in folders:
+            if not folder.exists():
+                self._known.pop(folder.name, None)
+        if self.on_batch is not None:
+            self.on_batch(cleaner, folders)
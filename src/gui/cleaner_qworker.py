@@ -16,28 +16,26 @@ class CleanerWorkerThread(QThread):
     to the main thread using Qt's signal and slot mechanism.
     """
     # --- Signals ---
-    # Emitted for each folder processed, carrying the beatmap ID (or -1 for skips).
-    progress = pyqtSignal(int)
+    # Emitted at most 10 times per second, carrying a `ProgressSnapshot`.
+    progress = pyqtSignal(object)
     # Emitted once when the entire cleaning process completes successfully.
     finished = pyqtSignal()
     # Emitted if any exception occurs during the cleaning process.
     error_occured = pyqtSignal(str)
 
+    songs_folder: Path
+    params: CleanerParams
+    cleaner: Cleaner
+    """Created by `run`, so it is only available once the first signal has been emitted."""
+
     def __init__(
         self,
         songs_folder: Path,
-        params: CleanerParams,
-        folders: list[Path]
+        params: CleanerParams
     ):
         super().__init__()
-        # The lambda function here is a simple way to connect the Cleaner's
-        # progress callback directly to this thread's `progress` signal.
-        self.cleaner = Cleaner(
-            songs_folder,
-            params,
-            lambda folder_id: self.progress.emit(folder_id)
-        )
-        self.folders = folders
+        self.songs_folder = songs_folder
+        self.params = params
 
     def run(self):
         """
@@ -45,7 +43,16 @@ class CleanerWorkerThread(QThread):
         when `thread.start()` is invoked.
         """
         try:
-            self.cleaner.start_clean(self.folders)
+            # Created here, as loading its indexes and caches reads from the disk.
+            # The lambda function here is a simple way to connect the Cleaner's
+            # callback directly to this thread's signal.
+            self.cleaner = Cleaner(
+                self.songs_folder,
+                self.params,
+                lambda snapshot: self.progress.emit(snapshot)
+            )
+            # The Songs folder is discovered by the cleaner while it works.
+            self.cleaner.start_clean()
             self.finished.emit()
         except (CleanError, OSUParsingError) as e:
             # For our custom, expected errors, print the formatted message
@@ -2,18 +2,22 @@ import os
 from enum import Enum
 from pathlib import Path
 
-from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QFontDatabase, QIcon
 from PyQt6.QtWidgets import (QApplication, QButtonGroup, QFileDialog,
                              QHBoxLayout, QLabel, QMainWindow, QMessageBox,
                              QProgressBar, QPushButton, QVBoxLayout, QWidget)
 
+from ..app.clean_plan import PlanTotals
+from ..app.file_utils import format_size
+from ..app.progress import ProgressSnapshot
 from ..app.types import CleanerParams
 from ..app.osu_parser import OSUGameModes
-from ..app.version import REPO_RELEASE_URL, check_for_updates
+from ..app.version import REPO_RELEASE_URL
 from ..utils import get_resource_path
 from .cleaner_qworker import CleanerWorkerThread
 from .title_bar import TitleBar
+from .update_qworker import UpdateCheckThread
 
 # Load the font globally for the application.
 font_path = get_resource_path("assets/Exo2.ttf")
@@ -22,6 +26,8 @@ font_path = get_resource_path("assets/Exo2.ttf")
 class BackgroundModes(Enum):
     """Defines the available options for handling beatmap backgrounds."""
     KEEP = "Keep"
+    DEDUPE = "Dedupe"
+    SHRINK = "Shrink"
     WHITE = "White"
     CUSTOM = "Custom"
     DELETE = "Delete"
@@ -31,6 +37,7 @@ class SHXCleanerApp(QMainWindow):
     """The main application window."""
     def __init__(self):
         super().__init__()
+        self.update_thread: UpdateCheckThread | None = None
 
         self.setWindowTitle("sh(x)cleaner")
         self.setWindowIcon(QIcon(get_resource_path("assets/icon.ico")))
@@ -117,11 +124,17 @@ class SHXCleanerApp(QMainWindow):
         self.backgrounds_group = QButtonGroup()
         self.backgrounds_group.setExclusive(True) # Only one background option can be active
         self.keep_var = QPushButton("Keep")
+        self.dedupe_var = QPushButton("Dedupe")
+        self.dedupe_var.setToolTip("Keep backgrounds, but store identical ones only once")
+        self.shrink_var = QPushButton("Shrink")
+        self.shrink_var.setToolTip("Keep backgrounds, but downscale larger ones to 1920x1080 and re-encode them")
         self.white_var = QPushButton("White")
         self.custom_var = QPushButton("Custom")
         self.delete_var = QPushButton("Delete")
 
-        for button in [self.keep_var, self.white_var, self.custom_var, self.delete_var]:
+        for button in [
+            self.keep_var, self.dedupe_var, self.shrink_var, self.white_var, self.custom_var, self.delete_var
+        ]:
             button.setCheckable(True)
             button.setStyleSheet("""
                 QPushButton {
@@ -160,16 +173,27 @@ class SHXCleanerApp(QMainWindow):
     def showEvent(self, event):
         """When the window is first shown, trigger the update check."""
         super().showEvent(event)
-        # Use a single shot timer to ensure the main event loop has started
-        # before we potentially block on a network request.
-        QTimer.singleShot(0, self.check_updates)
+        # showEvent also fires when the window is restored, but one check is enough.
+        if self.update_thread is None:
+            self.check_updates()
+
+    def closeEvent(self, a0):
+        """Lets a pending update check finish, as Qt aborts if a running QThread is destroyed."""
+        if self.update_thread is not None and self.update_thread.isRunning():
+            # The answer is no longer wanted; hide the window while the request times out.
+            self.update_thread.update_available.disconnect(self.__on_update_available)
+            self.hide()
+            self.update_thread.wait()
+        super().closeEvent(a0)
 
     def check_updates(self):
-        """Checks for a new version on GitHub and prompts the user if one is found."""
-        is_update_available, latest_version = check_for_updates()
-        if not is_update_available:
-            return
+        """Checks for a new version on GitHub in the background."""
+        self.update_thread = UpdateCheckThread(self)
+        self.update_thread.update_available.connect(self.__on_update_available)
+        self.update_thread.start()
 
+    def __on_update_available(self, latest_version: str):
+        """Prompts the user to open the release page. Connected to the update check."""
         mbox_result = QMessageBox.information(
             self, "Update available",
             f"A new version is available: {latest_version}\n"
@@ -231,6 +255,18 @@ class SHXCleanerApp(QMainWindow):
             "keep_videos": self.title_bar.keep_videos,
             "ignore_id_limit": self.title_bar.ignore_id_limit,
             "dangerous_clean_no_id": self.title_bar.dangerous_clean_no_id,
+            # Cleaning is dominated by filesystem calls that release the GIL,
+            # so a few threads per core keep the disk busy.
+            "workers": min(32, (os.cpu_count() or 1) * 2),
+            "dedupe_backgrounds": self.dedupe_var.isChecked(),
+            "shrink_backgrounds": self.shrink_var.isChecked(),
+            "dedupe_mapsets": self.title_bar.dedupe_mapsets,
+            "dedupe_media": self.title_bar.dedupe_media,
+            "profile": self.title_bar.profile,
+            "quarantine": self.title_bar.quarantine,
+            # osu!.db is only read if it is next to the Songs folder.
+            "use_osu_db": True,
+            "dry_run": self.title_bar.dry_run,
         }
 
     def start_cleaning(self):
@@ -266,36 +302,81 @@ class SHXCleanerApp(QMainWindow):
             )
             return
 
-        folders = [f for f in songs_folder_path.iterdir() if f.is_dir()]
-        self.progress.setMaximum(len(folders))
+        # The number of folders isn't known until the worker has counted them,
+        # so the bar starts out as a busy indicator.
+        self.progress.setMaximum(0)
         self.progress.setValue(0)
         self.start_button.setEnabled(False)
 
-        # The CleanerWorkerThread runs the actual cleaning logic in the background
-        # to prevent the GUI from freezing.
-        self.worker_thread = CleanerWorkerThread(
-            songs_folder_path.resolve(), params, folders
-        )
+        # The CleanerWorkerThread runs the actual cleaning logic (including listing
+        # the Songs folder) in the background to prevent the GUI from freezing.
+        self.worker_thread = CleanerWorkerThread(songs_folder_path.resolve(), params)
         self.worker_thread.progress.connect(self.__update_progress)
         self.worker_thread.finished.connect(self.__on_cleaning_finished)
         self.worker_thread.error_occured.connect(self.__on_cleaning_error)
         self.worker_thread.start()
 
-    def __update_progress(self, folder_id: int):
-        """Updates the progress bar. Connected to the worker's 'progress' signal."""
-        self.progress.setValue(self.progress.value() + 1)
-        # A folder_id of -1 is a signal for a skipped or invalid folder.
-        if folder_id != -1:
-            self.progress.setFormat(str(folder_id))
+    def __update_progress(self, snapshot: ProgressSnapshot):
+        """
+        Updates the progress bar. Connected to the worker's 'progress' signal,
+        which is rate-limited, so every snapshot is drawn.
+        """
+        # The bar stays a busy indicator until the folders have been counted.
+        if snapshot.total is not None:
+            self.progress.setMaximum(max(snapshot.total, snapshot.done, 1))
+            self.progress.setValue(snapshot.done)
+
+        freed = "to free" if self.worker_thread.cleaner.dry_run else "freed"
+        text = f"{snapshot.done} folders, {format_size(snapshot.bytes_freed)} {freed}"
+        if snapshot.phase != "cleaning":
+            text = f"{snapshot.phase.capitalize()}... {text}"
+        elif snapshot.eta_s is not None:
+            minutes, seconds = divmod(int(snapshot.eta_s), 60)
+            text += f", {minutes}:{seconds:02d} left"
+        self.progress.setFormat(text)
+
+        # The details that don't fit into the bar itself.
+        current = f"Last beatmap ID: {snapshot.folder_id}\n" if snapshot.folder_id != -1 else ""
+        self.progress.setToolTip(
+            f"{current}"
+            f"{snapshot.folders_per_s:.0f} folders/s\n"
+            f"{snapshot.files_deleted} files deleted"
+        )
 
     def __on_cleaning_finished(self):
         """Called when the worker thread successfully finishes."""
+        cleaner = self.worker_thread.cleaner
+        if cleaner.dry_run:
+            totals = cleaner.plan_totals
+            QMessageBox.information(
+                self, "Dry run finished",
+                f"Nothing was deleted. Cleaning would free {format_size(totals.total_bytes)} "
+                f"and remove {totals.folders_removed} folders.\n"
+                f"{self.__format_reclaimed(cleaner.plan_totals)}"
+                f"The full plan was written to {cleaner.plan_path.name} in your Songs folder."
+            )
+            self.close()
+            return
+
+        totals = cleaner.plan_totals
         QMessageBox.information(
             self, "Done!",
-            "Everything's clean. Check the size of your songs folder lol"
+            f"Everything's clean. {format_size(totals.total_bytes)} freed, "
+            f"{totals.folders_removed} folders removed.\n"
+            f"{self.__format_reclaimed(totals)}"
+            f"Details are in {cleaner.report_path.name} in your Songs folder."
         )
         self.close()
 
+    @staticmethod
+    def __format_reclaimed(totals: PlanTotals) -> str:
+        """One line per category that freed space, largest first."""
+        lines = [
+            f"{category.value.replace('_', ' ').capitalize()}: {format_size(size)} ({files} files)\n"
+            for category, size, files in totals.reclaimed_by_category()
+        ]
+        return "\n" + "".join(lines) + "\n" if lines else ""
+
     def __on_cleaning_error(self, msg: str):
         """Called if the worker thread encounters an unhandled exception."""
         QMessageBox.critical(
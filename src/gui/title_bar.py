@@ -24,6 +24,11 @@ class TitleBar(QWidget):
         self.keep_videos = False
         self.ignore_id_limit = False
         self.dangerous_clean_no_id = False
+        self.dedupe_mapsets = False
+        self.dedupe_media = False
+        self.dry_run = False
+        self.profile = False
+        self.quarantine = False
 
         title_bar_layout = QHBoxLayout(self)
         title_bar_layout.setContentsMargins(0, 0, 0, 0)
@@ -110,6 +115,36 @@ class TitleBar(QWidget):
         dangerous_clean_no_id_action.toggled.connect(self.on_dangerous_clean_no_id_toggled)
         menu.addAction(dangerous_clean_no_id_action)
 
+        dedupe_mapsets_action = QAction('Remove duplicate mapsets (by content)', self)
+        dedupe_mapsets_action.setCheckable(True)
+        dedupe_mapsets_action.setChecked(self.dedupe_mapsets)
+        dedupe_mapsets_action.toggled.connect(self.on_dedupe_mapsets_toggled)
+        menu.addAction(dedupe_mapsets_action)
+
+        dedupe_media_action = QAction('Dedupe audio/video (hard-link identical files)', self)
+        dedupe_media_action.setCheckable(True)
+        dedupe_media_action.setChecked(self.dedupe_media)
+        dedupe_media_action.toggled.connect(self.on_dedupe_media_toggled)
+        menu.addAction(dedupe_media_action)
+
+        quarantine_action = QAction('Quarantine (move removed folders aside, delete them next run)', self)
+        quarantine_action.setCheckable(True)
+        quarantine_action.setChecked(self.quarantine)
+        quarantine_action.toggled.connect(self.on_quarantine_toggled)
+        menu.addAction(quarantine_action)
+
+        dry_run_action = QAction('Dry run (only write a deletion plan)', self)
+        dry_run_action.setCheckable(True)
+        dry_run_action.setChecked(self.dry_run)
+        dry_run_action.toggled.connect(self.on_dry_run_toggled)
+        menu.addAction(dry_run_action)
+
+        profile_action = QAction('Profile (add profiler data to clean_report.json)', self)
+        profile_action.setCheckable(True)
+        profile_action.setChecked(self.profile)
+        profile_action.toggled.connect(self.on_profile_toggled)
+        menu.addAction(profile_action)
+
         # --- Positioning and Displaying the Menu ---
         main_window = self.window()
         if not main_window:
@@ -129,6 +164,11 @@ class TitleBar(QWidget):
     def on_keep_videos_toggled(self, checked: bool): self.keep_videos = checked
     def on_ignore_id_limit_toggled(self, checked: bool): self.ignore_id_limit = checked
     def on_dangerous_clean_no_id_toggled(self, checked: bool): self.dangerous_clean_no_id = checked
+    def on_dedupe_mapsets_toggled(self, checked: bool): self.dedupe_mapsets = checked
+    def on_dedupe_media_toggled(self, checked: bool): self.dedupe_media = checked
+    def on_quarantine_toggled(self, checked: bool): self.quarantine = checked
+    def on_dry_run_toggled(self, checked: bool): self.dry_run = checked
+    def on_profile_toggled(self, checked: bool): self.profile = checked
 
     # --- Window Dragging Logic ---
     def mousePressEvent(self, event: QMouseEvent):
@@ -0,0 +1,18 @@
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from ..app.version import check_for_updates
+
+
+class UpdateCheckThread(QThread):
+    """
+    A dedicated QThread for the update check, so that a slow or missing
+    network connection never freezes the window.
+    """
+    # --- Signals ---
+    # Emitted only if a newer release exists, carrying its version tag.
+    update_available = pyqtSignal(str)
+
+    def run(self):
+        is_update_available, latest_version = check_for_updates()
+        if is_update_available:
+            self.update_available.emit(latest_version)